@@ -0,0 +1,109 @@
+from catalog import encode_cursor, decode_cursor
+
+# Server-side filtered, keyset-paginated listings for the admin dashboard. Like
+# catalog.py, each page is one index range scan of per_page + 1 rows however
+# deep it is; the supporting indexes are in migrations/007.
+
+ADMIN_PAGE_SIZE = 50
+
+USER_ROLES = ('admin', 'buyer', 'seller')
+USER_STATUSES = ('active', 'archived')
+REQUEST_STATUSES = ('pending', 'approved', 'rejected')
+
+# sort key -> (column, direction, label); ids follow creation order. Every
+# sort column has an index after each filter prefix (migrations 007 and 010),
+# so a new sort needs those indexes first.
+USER_SORTS = {
+    'newest': ('id', 'DESC', 'Newest'),
+    'oldest': ('id', 'ASC', 'Oldest'),
+    'name': ('name', 'ASC', 'Name'),
+}
+REQUEST_SORTS = {
+    'oldest': ('id', 'ASC', 'Oldest first'),
+    'newest': ('id', 'DESC', 'Newest first'),
+    'business_name': ('business_name', 'ASC', 'Business name'),
+}
+
+
+def like_prefix(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+# One page of `table` rows as dicts. Returns (rows, next_cursor).
+def _keyset_page(cursor, table, columns, conditions, params, sort, after, per_page):
+    sort_column, direction = sort[:2]
+    op = '<' if direction == 'DESC' else '>'
+    last = decode_cursor(after, int if sort_column == 'id' else str)
+    if last is not None:
+        if sort_column == 'id':
+            conditions.append(f"id {op} %s")
+            params.append(last[1])
+        else:
+            conditions.append(f"({sort_column} {op} %s OR ({sort_column} = %s AND id {op} %s))")
+            params.extend([last[0], last[0], last[1]])
+
+    order = f"id {direction}" if sort_column == 'id' else f"{sort_column} {direction}, id {direction}"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"""
+        SELECT {columns}
+        FROM {table}
+        {where}
+        ORDER BY {order}
+        LIMIT %s
+    """, params + [per_page + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([rows[-1][sort_column], rows[-1]['id']])
+    return rows, next_cursor
+
+
+# `cursor` must be a dictionary cursor; unknown filter values are ignored
+def fetch_users(cursor, role=None, status=None, prefix='', sort='newest', after=None, per_page=ADMIN_PAGE_SIZE):
+    conditions, params = [], []
+    if status in USER_STATUSES:
+        conditions.append("status = %s")
+        params.append(status)
+    if role in USER_ROLES:
+        conditions.append("role = %s")
+        params.append(role)
+    if prefix:
+        conditions.append("(name LIKE %s OR email LIKE %s)")
+        params.extend([like_prefix(prefix)] * 2)
+    return _keyset_page(cursor, 'users', 'id, name, email, role, status', conditions, params,
+                        USER_SORTS.get(sort, USER_SORTS['newest']), after, per_page)
+
+
+def fetch_seller_requests(cursor, status='pending', prefix='', sort='oldest', after=None, per_page=ADMIN_PAGE_SIZE):
+    conditions, params = [], []
+    if status in REQUEST_STATUSES:
+        conditions.append("status = %s")
+        params.append(status)
+    if prefix:
+        conditions.append("(business_name LIKE %s OR email LIKE %s)")
+        params.extend([like_prefix(prefix)] * 2)
+    columns = ('id, business_name, contact_number, email, id_proof, profile_description, '
+               'payment_details, product_photo, status')
+    return _keyset_page(cursor, 'seller_requests', columns, conditions, params,
+                        REQUEST_SORTS.get(sort, REQUEST_SORTS['oldest']), after, per_page)
+
+
+# Header widget numbers: users per role and status, seller requests per status
+def count_totals(cursor):
+    cursor.execute("SELECT role, status, COUNT(*) AS total FROM users GROUP BY role, status")
+    users = {'total': 0, 'roles': dict.fromkeys(USER_ROLES, 0), 'statuses': dict.fromkeys(USER_STATUSES, 0)}
+    for row in cursor.fetchall():
+        users['total'] += row['total']
+        if row['role'] in users['roles']:
+            users['roles'][row['role']] += row['total']
+        if row['status'] in users['statuses']:
+            users['statuses'][row['status']] += row['total']
+
+    cursor.execute("SELECT status, COUNT(*) AS total FROM seller_requests GROUP BY status")
+    requests = dict.fromkeys(REQUEST_STATUSES, 0)
+    for row in cursor.fetchall():
+        if row['status'] in requests:
+            requests[row['status']] = row['total']
+    return {'users': users, 'seller_requests': requests}
@@ -1,32 +1,30 @@
-import os, json
+import os, json, hmac, hashlib, time
+from decimal import Decimal
 import mysql.connector
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
-from jinja2 import Environment, FileSystemLoader
+import click
+from flask.cli import AppGroup
 from mysql.connector import IntegrityError
-
-app = Flask(__name__)
-app.secret_key = 'your_secret_key'
-
-# Set upload folder configuration
-UPLOAD_FOLDER = 'uploads/'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Ensure the upload folder exists
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
-# Connect to MySQL database
-db = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="ecommerce_db_backup"
-)
-
-cursor = db.cursor()
+from database import init_db, get_db, get_pool, PoolTimeout
+from cache import init_cache, get_cache
+from fragments import init_fragments, product_tag, product_card
+from metrics import init_metrics
+import seller_stats, inventory, carts, order_history
+from images import generate_variants, variant_name, variant_widths
+import file_delivery, ingest, blobstore, admin_lists, migrations, query_plans, catalog_api
+from background import init_background, submit as submit_background
+import passwords
+from catalog import fetch_product_page, page_size, encode_cursor, decode_cursor, PRODUCT_SORTS, DEFAULT_SORT, DEFAULT_PAGE_SIZE
+
+# Routes, template helpers and error handlers live on the `main` blueprint, so
+# endpoints are named main.<view> (url_for('main.login')). create_app() below
+# builds a new app around it on each call; serve the app through it:
+#   gunicorn --preload -w 4 'app:create_app()'
+#   flask --app 'app:create_app()' run
+bp = Blueprint('main', __name__)
 
 # Decorators for authentication
 def login_required(f):
@@ -34,7 +32,7 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash("Please log in to access this page.", 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -43,23 +41,172 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if session.get('role') != 'admin':
             flash("You do not have access to this page.", 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
+# Keyed fingerprint of a password, stored in users.password_fingerprint (unique index)
+# so the "password already in use" check is a single indexed lookup instead of a
+# PBKDF2 derivation per registered user
+def password_fingerprint(password):
+    key = current_app.config['PASSWORD_FINGERPRINT_KEY'].encode()
+    return hmac.new(key, password.encode(), hashlib.sha256).hexdigest()
+
+# A throttled or shed password attempt: the form again with the reason and Retry-After
+def password_rejected(error, template, category):
+    flash(error.message, category)
+    return render_template(template), error.status, {'Retry-After': str(error.retry_after)}
+
+# Cached reads of rarely-changing catalog data. Entries are tagged with what they
+# depend on and dropped by the write routes through invalidate_products()/'categories'.
+def cached_categories():
+    def load():
+        cursor = get_db().cursor()
+        cursor.execute("SELECT id, name FROM categories")
+        return cursor.fetchall()
+    return get_cache().get_or_set('categories', load, tags=('categories',))
+
+def product_list_tag(category_id):
+    return 'products:all' if category_id in (None, '', 'all') else f'products:category:{category_id}'
+
+def product_page_key(category_id, search_query, sort, after, per_page):
+    return 'products:' + json.dumps([category_id, search_query, sort, after, per_page])
+
+# One page of the product grid as (rows, next_cursor)
+def cached_product_page(category_id, search_query, sort, after, per_page):
+    def load():
+        cursor = get_db().cursor(dictionary=True)
+        page = fetch_product_page(cursor, category_id, search_query, sort, after, per_page)
+        cursor.close()
+        return page
+    return get_cache().get_or_set(product_page_key(category_id, search_query, sort, after, per_page), load,
+                                  tags=(product_list_tag(category_id),))
+
+def invalidate_products(*category_ids):
+    get_cache().invalidate_tags('products:all', *{product_list_tag(c) for c in category_ids if c is not None})
+
+# One product changed: its cached grid card and the lists it appears in
+def invalidate_product(product_id, category_id):
+    get_cache().invalidate_tags(product_tag(product_id), 'products:all', product_list_tag(category_id))
+
+# Seller order list: status tabs and page size
+SELLER_ORDER_STATUSES = ('all', 'Pending', 'Shipped', 'Delivered', 'Cancelled')
+SELLER_ORDERS_PER_PAGE = 20
+
+# Group consecutive order-line rows into orders with a 'products' list. Rows must be
+# ordered by order; only the order being built is held in memory.
+def group_order_lines(rows):
+    order = None
+    for row in rows:
+        if order is None or row['order_id'] != order['order_id']:
+            if order is not None:
+                yield order
+            order = {
+                'order_id': row['order_id'],
+                'status': 'Cancelled' if row['order_status'] == 'Cancelled' else row['seller_status'],
+                'created_at': row['created_at'],
+                'payment_method': row['payment_method'],
+                'buyer_name': row['buyer_name'],
+                'buyer_email': row['buyer_email'],
+                'buyer_address': row['buyer_address'],
+                'products': [],
+            }
+        order['products'].append({
+            'name': row['product_name'],
+            'quantity': row['quantity'],
+            'price': row['price'],
+            'size': row['size'],
+            'pages': row['pages'],
+        })
+    if order is not None:
+        yield order
+
+# Status filter: the seller's line status, or the order itself for Cancelled
+def seller_order_conditions(seller_id, status):
+    conditions = ["p.user_id = %s"]
+    params = [seller_id]
+    if status == 'Cancelled':
+        conditions.append("o.status = 'Cancelled'")
+    elif status != 'all':
+        conditions.append("oi.seller_status = %s AND o.status != 'Cancelled'")
+        params.append(status)
+    return conditions, params
+
+# (sql, params) for one page of a seller's order ids, newest first (keyset on created_at, id)
+def seller_order_page_query(seller_id, status, after, per_page):
+    conditions, params = seller_order_conditions(seller_id, status)
+    if after:
+        conditions.append("(o.created_at < %s OR (o.created_at = %s AND o.id < %s))")
+        params += [after[0], after[0], after[1]]
+    return f"""
+        SELECT DISTINCT o.id, o.created_at
+        FROM products p
+        JOIN order_items oi ON oi.product_id = p.id
+        JOIN orders o ON oi.order_id = o.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT %s
+    """, params + [per_page + 1]
+
+# (page, next_cursor) from the per_page + 1 (id, created_at) rows of the page query
+def finish_seller_order_page(page, per_page):
+    next_cursor = None
+    if len(page) > per_page:
+        page = page[:per_page]
+        next_cursor = encode_cursor([page[-1][1], page[-1][0]])
+    return page, next_cursor
+
+# (sql, params) for one row per order line of these orders, ordered so each
+# order's lines are adjacent for group_order_lines()
+def seller_order_lines_query(order_ids, seller_id, status):
+    conditions, params = seller_order_conditions(seller_id, status)
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    return f"""
+        SELECT 
+            o.id AS order_id,
+            oi.seller_status,
+            o.status AS order_status,
+            o.created_at,
+            o.payment_method,
+            u.name AS buyer_name,
+            u.email AS buyer_email,
+            a.address AS buyer_address,
+            p.product_name,
+            oi.quantity,
+            oi.price,
+            p.size,
+            p.pages
+        FROM orders o
+        JOIN order_items oi ON o.id = oi.order_id
+        JOIN products p ON oi.product_id = p.id
+        JOIN users u ON o.user_id = u.id
+        JOIN addresses a ON o.address_id = a.id
+        WHERE o.id IN ({placeholders}) AND {' AND '.join(conditions)}
+        ORDER BY o.created_at DESC, o.id DESC, oi.id
+    """, list(order_ids) + params
+
+# Lock a product row for a write: (user_id, category_id, stock, is_archive) or None
+def lock_product(cursor, product_id):
+    cursor.execute("SELECT user_id, category_id, stock, is_archive FROM products WHERE id = %s FOR UPDATE", (product_id,))
+    return cursor.fetchone()
+
 # Index Route (Homepage)
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 # Signup Route
-@app.route('/signup', methods=['GET', 'POST'])
+@bp.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         try:
             name = request.form['name']
             email = request.form['email']
             password = request.form['password']
+            passwords.throttle_signup(request.remote_addr)
+
+            db = get_db()
+            cursor = db.cursor()
             
             # Check for existing name or email using a single query
             cursor.execute("""
@@ -74,127 +221,199 @@ def signup():
                     flash('That name is already taken. Please use a different name.', 'signup-error')
                 else:
                     flash('That email is already registered. Please use a different email.', 'signup-error')
-                return redirect(url_for('signup'))
+                return redirect(url_for('main.signup'))
 
             # Check if password is already in use
-            cursor.execute("SELECT password FROM users")
-            existing_passwords = cursor.fetchall()
-            
-            for existing_password in existing_passwords:
-                if check_password_hash(existing_password[0], password):
-                    flash('This password is already in use. Please choose a different password.', 'signup-error')
-                    return redirect(url_for('signup'))
+            fingerprint = password_fingerprint(password)
+            cursor.execute("SELECT 1 FROM users WHERE password_fingerprint = %s LIMIT 1", (fingerprint,))
+            if cursor.fetchone():
+                flash('This password is already in use. Please choose a different password.', 'signup-error')
+                return redirect(url_for('main.signup'))
 
             # If no duplicates found, proceed with signup
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = passwords.hash_password(password)
             cursor.execute(
-                "INSERT INTO users (name, email, password, role, status) VALUES (%s, %s, %s, %s, %s)",
-                (name, email, hashed_password, 'buyer', 'active')
+                "INSERT INTO users (name, email, password, password_fingerprint, role, status) VALUES (%s, %s, %s, %s, %s, %s)",
+                (name, email, hashed_password, fingerprint, 'buyer', 'active')
             )
             db.commit()
+            get_cache().invalidate_tags('users')
             flash('Account created successfully! You can log in now.', 'signup-success')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
+
+        except IntegrityError as e:
+            # The unique keys catch a concurrent signup that passed the checks above
+            get_db().rollback()
+            if 'password_fingerprint' in str(e):
+                flash('This password is already in use. Please choose a different password.', 'signup-error')
+            else:
+                flash('That email is already registered. Please use a different email.', 'signup-error')
+            return redirect(url_for('main.signup'))
+
+        except passwords.Rejected as e:
+            return password_rejected(e, 'signup.html', 'signup-error')
             
         except Exception as e:
-            db.rollback()
+            get_db().rollback()
             flash('An error occurred during signup. Please try again.', 'signup-error')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
 
     return render_template('signup.html')
 
 
 
-# Assuming your uploads folder is at the root level of your project
-UPLOAD_FOLDER = 'uploads' 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Custom Jinja filter for images
-@app.template_filter('image_path')
-def image_path(filename):
-    return url_for('uploaded_file', filename=filename)
-
-app.jinja_env.filters['image_path'] = image_path
+# Upload URLs carry a content version so browsers and the CDN can cache them forever
+def upload_url(filename):
+    return url_for('main.uploaded_file', filename=filename,
+                   **file_delivery.version_args(current_app.config['UPLOAD_FOLDER'], filename))
+
+# Custom Jinja filter for images. With a width and the original's stored width,
+# returns the smallest resized variant at least that wide (or the original).
+@bp.app_template_filter('image_path')
+def image_path(filename, width=None, original_width=None):
+    if width and filename:
+        for variant_width in variant_widths(original_width):
+            if variant_width >= width:
+                return upload_url(variant_name(filename, variant_width))
+    return upload_url(filename)
+
+# srcset listing every resized variant of an upload plus the original
+@bp.app_template_filter('image_srcset')
+def image_srcset(filename, original_width=None):
+    if not filename or not original_width:
+        return ''
+    candidates = [
+        f"{upload_url(variant_name(filename, width))} {width}w"
+        for width in variant_widths(original_width)
+    ]
+    candidates.append(f"{upload_url(filename)} {original_width}w")
+    return ', '.join(candidates)
 
 # View Document Route
-@app.route('/view_document/<document_id>', methods=['GET'])
+@bp.route('/view_document/<document_id>', methods=['GET'])
 def view_document(document_id):
-    return send_from_directory('uploads', document_id)
+    return file_delivery.send(current_app.config['UPLOAD_FOLDER'], document_id, private=True)
 
 # Admin Dashboard Route
-@app.route('/admin/dashboard')
+@bp.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    # Fetch seller requests
-    cursor.execute(""" 
-        SELECT 
-            id, 
-            business_name, 
-            contact_number, 
-            email, 
-            id_proof, 
-            profile_description, 
-            payment_details, 
-            product_photo 
-        FROM seller_requests 
-        WHERE status = 'pending'
-    """)
-    seller_requests = [
-        {
-            'id': row[0],
-            'business_name': row[1],
-            'contact_number': row[2],
-            'email': row[3],
-            'id_proof': row[4],
-            'profile_description': row[5],
-            'payment_details': row[6],
-            'product_photo': row[7]
-        }
-        for row in cursor.fetchall()
-    ]
+    cursor = get_db().cursor(dictionary=True)
+
+    # Seller requests: pending by default, filtered and paged in SQL
+    request_filters = {
+        'request_status': request.args.get('request_status', 'pending'),
+        'request_q': request.args.get('request_q', '').strip(),
+        'request_sort': request.args.get('request_sort', 'oldest'),
+    }
+    seller_requests, next_request_cursor = admin_lists.fetch_seller_requests(
+        cursor,
+        status=request_filters['request_status'],
+        prefix=request_filters['request_q'],
+        sort=request_filters['request_sort'],
+        after=request.args.get('request_after'),
+    )
 
-    # Fetch registered users
-    cursor.execute("""
-        SELECT 
-            id, 
-            name, 
-            email,
-            role, 
-            status 
-        FROM users  -- Replace with your actual user table name
-    """)
-    users = [
-        {
-            'id': row[0],
-            'username': row[1],
-            'email': row[2],
-            'role': row[3],
-            'status': row[4]
-        }
-        for row in cursor.fetchall()
-    ]
+    # Registered users
+    user_filters = {
+        'role': request.args.get('role', ''),
+        'status': request.args.get('status', ''),
+        'q': request.args.get('q', '').strip(),
+        'sort': request.args.get('sort', 'newest'),
+    }
+    users, next_user_cursor = admin_lists.fetch_users(
+        cursor,
+        role=user_filters['role'],
+        status=user_filters['status'],
+        prefix=user_filters['q'],
+        sort=user_filters['sort'],
+        after=request.args.get('after'),
+    )
 
-    return render_template('admin_dashboard.html', seller_requests=seller_requests, users=users)
+    totals = get_cache().get_or_set('admin:totals', lambda: admin_lists.count_totals(cursor),
+                                    ttl=60, tags=('users', 'seller_requests'))
+
+    return render_template(
+        'admin_dashboard.html',
+        seller_requests=seller_requests,
+        users=users,
+        totals=totals,
+        request_filters=request_filters,
+        user_filters=user_filters,
+        next_request_cursor=next_request_cursor,
+        next_user_cursor=next_user_cursor,
+        requests_first_page=not request.args.get('request_after'),
+        users_first_page=not request.args.get('after'),
+        user_sorts=admin_lists.USER_SORTS,
+        request_sorts=admin_lists.REQUEST_SORTS,
+        user_roles=admin_lists.USER_ROLES,
+        user_statuses=admin_lists.USER_STATUSES,
+        request_statuses=admin_lists.REQUEST_STATUSES,
+    )
+
+# Admin dashboard URL with some of the current filters replaced (None drops one)
+@bp.app_template_global()
+def admin_dashboard_url(**changes):
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for('main.admin_dashboard', **{k: v for k, v in args.items() if v not in (None, '')})
+
+# Cache hit/miss counters
+@bp.route('/admin/cache_stats')
+@admin_required
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+# Background pool queue depth and inline fallbacks, used to size BACKGROUND_WORKERS
+@bp.route('/admin/background_stats')
+@admin_required
+def background_stats():
+    return jsonify(current_app.extensions['background'].stats())
+
+# Hashing pool load, shed and throttled attempts, used to size PASSWORD_HASH_WORKERS
+@bp.route('/admin/password_stats')
+@admin_required
+def password_stats():
+    return jsonify(current_app.extensions['passwords'].stats())
+
+# Startup timings from create_app(), for tuning worker restarts
+@bp.route('/admin/startup_stats')
+@admin_required
+def startup_stats():
+    return jsonify(current_app.extensions['startup'])
+
+# Connection pool wait times and utilization, used to size DB_POOL_SIZE
+@bp.route('/admin/db_pool_stats')
+@admin_required
+def db_pool_stats():
+    return jsonify(get_pool().stats())
 
 # Archive User Route
-@app.route('/admin/archive_user/<int:user_id>', methods=['POST'])
+@bp.route('/admin/archive_user/<int:user_id>', methods=['POST'])
 @admin_required
 def archive_user(user_id):
+    db = get_db()
+    cursor = db.cursor()
     try:
         cursor.execute("UPDATE users SET status = 'archived' WHERE id = %s", (user_id,))
         db.commit()
+        get_cache().invalidate_tags('users')
         flash('User archived successfully!', 'admin-success')
     except mysql.connector.Error as err:
         flash(f"Error: {err}", 'admin-danger')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 
-@app.route('/unarchive_user/<int:user_id>', methods=['POST'])
+@bp.route('/unarchive_user/<int:user_id>', methods=['POST'])
 def unarchive_user(user_id):
+    db = get_db()
+    cursor = db.cursor()
     try:
         # Query to update the user status to active
         query = "UPDATE users SET status = 'active' WHERE id = %s"
         cursor.execute(query, (user_id,))
         db.commit()  # Commit the changes to the database
+        get_cache().invalidate_tags('users')
 
         if cursor.rowcount > 0:
             flash('User has been unarchived successfully', 'admin-success')
@@ -203,13 +422,15 @@ def unarchive_user(user_id):
     except mysql.connector.Error as err:
         flash(f"Error: {err}", 'admin-danger')
 
-    return redirect(url_for('admin_dashboard'))  # Replace 'admin_dashboard' with your dashboard route
+    return redirect(url_for('main.admin_dashboard'))  # Replace 'admin_dashboard' with your dashboard route
 
 
 # Approve Seller Request
-@app.route('/admin/approve_request/<int:request_id>', methods=['GET'])
+@bp.route('/admin/approve_request/<int:request_id>', methods=['GET'])
 @admin_required
 def approve_request(request_id):
+    db = get_db()
+    cursor = db.cursor()
     try:
         # Check if the seller request exists
         cursor.execute("SELECT user_id FROM seller_requests WHERE id = %s", (request_id,))
@@ -221,6 +442,7 @@ def approve_request(request_id):
             cursor.execute("UPDATE users SET role = 'seller' WHERE id = %s", (user_id,))
             cursor.execute("UPDATE seller_requests SET status = 'approved' WHERE id = %s", (request_id,))
             db.commit()  # Commit the changes
+            get_cache().invalidate_tags('users', 'seller_requests')
             flash('Seller request approved successfully!', 'admin-success')
         else:
             flash('Request not found!', 'admin-error')
@@ -228,13 +450,15 @@ def approve_request(request_id):
         db.rollback()  # Roll back any changes on error
         flash(f"Error: {err}", 'admin-danger')
 
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 
 # Reject Seller Request
-@app.route('/admin/reject_request/<int:request_id>', methods=['GET'])
+@bp.route('/admin/reject_request/<int:request_id>', methods=['GET'])
 @admin_required
 def reject_request(request_id):
+    db = get_db()
+    cursor = db.cursor()
     try:
         # Check if the seller request exists
         cursor.execute("SELECT id FROM seller_requests WHERE id = %s", (request_id,))
@@ -244,6 +468,7 @@ def reject_request(request_id):
             # Update the status to 'rejected'
             cursor.execute("UPDATE seller_requests SET status = 'rejected' WHERE id = %s", (request_id,))
             db.commit()  # Commit the changes
+            get_cache().invalidate_tags('seller_requests')
             flash('Seller request rejected successfully!', 'admin-success')
         else:
             flash('Request not found!', 'admin-error')
@@ -251,18 +476,21 @@ def reject_request(request_id):
         db.rollback()  # Roll back any changes on error
         flash(f"Error: {err}", 'admin-danger')
 
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 
-@app.route('/change_role/<int:user_id>', methods=['POST'])
+@bp.route('/change_role/<int:user_id>', methods=['POST'])
 def change_role(user_id):
     new_role = request.form.get('role')
+    db = get_db()
     cursor = db.cursor()
 
     # Update the user's role in the database
     try:
         cursor.execute("UPDATE users SET role = %s WHERE id = %s", (new_role, user_id))
         db.commit()
+        # The admin totals count users per role
+        get_cache().invalidate_tags('users')
         flash(f'Role updated to {new_role} for user with ID {user_id}', 'success')
     except mysql.connector.Error as err:
         db.rollback()
@@ -270,17 +498,35 @@ def change_role(user_id):
     finally:
         cursor.close()
 
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
-        cursor.execute("SELECT id, name, password, role, status FROM users WHERE email = %s", (email,))
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("SELECT id, name, password, role, status, password_fingerprint FROM users WHERE email = %s", (email,))
         user = cursor.fetchone()
-        if user and user[4] == 'active' and check_password_hash(user[2], password):
+        try:
+            # Attempts are counted before any hashing, so a refused one costs nothing
+            passwords.throttle(ip=request.remote_addr, account=email)
+            valid = bool(user) and user[4] == 'active' and passwords.verify_password(user[2], password)
+        except passwords.Rejected as e:
+            return password_rejected(e, 'login.html', 'login-danger')
+        if valid:
+            # Backfill the fingerprint for accounts created before it existed
+            if user[5] is None:
+                try:
+                    cursor.execute("UPDATE users SET password_fingerprint = %s WHERE id = %s",
+                                   (password_fingerprint(password), user[0]))
+                    db.commit()
+                except IntegrityError:
+                    # Legacy account sharing a password with another user; leave it unset
+                    db.rollback()
+
             session['user_id'] = user[0]
             session['name'] = user[1]
             session['role'] = user[3]
@@ -293,61 +539,32 @@ def login():
                 
             # Default redirect based on role
             if user[3] == 'admin':
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('main.admin_dashboard'))
             elif user[3] == 'seller':
-                return redirect(url_for('seller_dashboard'))
+                return redirect(url_for('main.seller_dashboard'))
             else:
-                return redirect(url_for('buyer_dashboard'))
+                return redirect(url_for('main.buyer_dashboard'))
         else:
             flash('Invalid credentials or inactive account. Please try again.', 'login-danger')
     return render_template('login.html')
 
 # seller Dashboard Route
-@app.route('/seller_dashboard')
+@bp.route('/seller_dashboard')
 @login_required
 def seller_dashboard():
     # Create cursor
+    db = get_db()
     cursor = db.cursor(dictionary=True)
     
     # Get user_id of logged in seller
     user_id = session['user_id']
     
-    cursor.execute("""
-        SELECT COUNT(DISTINCT o.id) as active_orders
-        FROM orders o
-        JOIN order_items oi ON o.id = oi.order_id
-        JOIN products p ON oi.product_id = p.id
-        WHERE oi.seller_status = 'Shipped' AND p.user_id = %s
-    """, (user_id,))
-    active_orders = cursor.fetchone()['active_orders'] or 0
-    
-    cursor.execute("""
-        SELECT SUM(stock) as total_stock
-        FROM products 
-        WHERE user_id = %s AND is_archive = 0
-    """, (user_id,))
-    total_stock = cursor.fetchone()['total_stock'] or 0
-    
-    # Get current seller's pending orders count
-    cursor.execute("""
-        SELECT COUNT(DISTINCT o.id) as count
-        FROM orders o 
-        JOIN order_items oi ON o.id = oi.order_id
-        JOIN products p ON oi.product_id = p.id
-        WHERE p.user_id = %s AND oi.seller_status = 'Pending'
-    """, (user_id,))
-    pending_orders_count = cursor.fetchone()['count']
-
-    # Get total sales for this specific seller
-    cursor.execute("""
-        SELECT SUM(oi.quantity * oi.price) AS total_sales 
-        FROM order_items oi
-        JOIN products p ON oi.product_id = p.id
-        WHERE oi.seller_status = 'Delivered' 
-        AND p.user_id = %s
-    """, (user_id,))
-    result = cursor.fetchone()
-    total_sales = result['total_sales'] if result['total_sales'] is not None else 0
+    # Dashboard counters are maintained by the order and product routes
+    stats = seller_stats.get(db, user_id)
+    active_orders = stats['active_orders']
+    total_stock = stats['total_stock']
+    pending_orders_count = stats['pending_orders']
+    total_sales = stats['total_sales']
 
     # Get user's products
     cursor.execute("SELECT * FROM products WHERE user_id = %s", (user_id,))
@@ -364,108 +581,88 @@ def seller_dashboard():
                          total_stock=total_stock,
                          total_sales=total_sales)
 
-@app.route('/seller_account_settings')
+@bp.route('/seller_account_settings')
 def seller_account_settings():
     if 'user_id' not in session:
         flash('Please log in to access the dashboard.', 'danger')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # Retrieve the user's name from the session
     user_name = session.get('name')  # Use 'name' stored in session
     return render_template('seller_account_settings.html', user_name=user_name)
 
 
-@app.route('/archive_product/<int:product_id>', methods=['POST'])
+@bp.route('/archive_product/<int:product_id>', methods=['POST'])
 @login_required
 def archive_product(product_id):
+    db = get_db()
+    cursor = db.cursor()
+    product = lock_product(cursor, product_id)
     cursor.execute("UPDATE products SET is_archive = 1 WHERE id = %s", (product_id,))
+    if product and not product[3]:
+        seller_stats.stock_changed(db, product[0], -product[2])
     db.commit()
+    if product:
+        invalidate_product(product_id, product[1])
     flash('Product has been marked as deleted.', 'success')
-    return redirect(url_for('seller_dashboard'))
+    return redirect(url_for('main.seller_dashboard'))
 
-@app.route('/unarchive_product/<int:product_id>', methods=['POST'])
+@bp.route('/unarchive_product/<int:product_id>', methods=['POST'])
 @login_required
 def unarchive_product(product_id):
+    db = get_db()
+    cursor = db.cursor()
+    product = lock_product(cursor, product_id)
     cursor.execute("UPDATE products SET is_archive = 0 WHERE id = %s", (product_id,))
+    if product and product[3]:
+        seller_stats.stock_changed(db, product[0], product[2])
     db.commit()
+    if product:
+        invalidate_product(product_id, product[1])
     flash('Product has been restored.', 'success')
-    return redirect(url_for('seller_dashboard'))
+    return redirect(url_for('main.seller_dashboard'))
 
-@app.route('/seller_orders')
+@bp.route('/seller_orders')
 @login_required
 def seller_orders():
     seller_id = session['user_id']
-    cursor = db.cursor(dictionary=True)
-
-    query = """
-    SELECT 
-        o.id AS order_id,
-        oi.seller_status AS status,
-        o.created_at,
-        o.payment_method,
-        u.name AS buyer_name,
-        u.email AS buyer_email,
-        a.address AS buyer_address,
-        GROUP_CONCAT(p.product_name) AS product_names,
-        GROUP_CONCAT(oi.quantity) AS quantities,
-        GROUP_CONCAT(oi.price) AS prices,
-        GROUP_CONCAT(p.size) AS sizes,
-        GROUP_CONCAT(p.pages) AS pages
-    FROM orders o
-    JOIN order_items oi ON o.id = oi.order_id
-    JOIN products p ON oi.product_id = p.id AND p.user_id = %s  
-    JOIN users u ON o.user_id = u.id
-    JOIN addresses a ON o.address_id = a.id
-    GROUP BY o.id
-    ORDER BY o.created_at DESC
-    """
-    
-    cursor.execute(query, (seller_id,))
-    orders = cursor.fetchall()
-
-    # Process the grouped data
-    processed_orders = []
-    for order in orders:
-        # Check if any of the GROUP_CONCAT results are None
-        if (order['product_names'] is None or 
-            order['quantities'] is None or 
-            order['prices'] is None or 
-            order['sizes'] is None or 
-            order['pages'] is None):
-            continue
+    status = request.args.get('status', 'all')
+    if status not in SELLER_ORDER_STATUSES:
+        status = 'all'
+    after = decode_cursor(request.args.get('after'), str)
+    per_page = SELLER_ORDERS_PER_PAGE
+
+    db = get_db()
+    cursor = db.cursor(buffered=True)
+    cursor.execute(*seller_order_page_query(seller_id, status, after, per_page))
+    page, next_cursor = finish_seller_order_page(cursor.fetchall(), per_page)
+    cursor.close()
 
-        order['products'] = []
-        try:
-            product_names = order['product_names'].split(',')
-            quantities = order['quantities'].split(',')
-            prices = order['prices'].split(',')
-            sizes = order['sizes'].split(',')
-            pages = order['pages'].split(',')
-            
-            for i in range(len(product_names)):
-                order['products'].append({
-                    'name': product_names[i],
-                    'quantity': quantities[i],
-                    'price': prices[i],
-                    'size': sizes[i],
-                    'pages': pages[i]
-                })
-            processed_orders.append(order)
-        except (AttributeError, IndexError) as e:
-            print(f"Error processing order {order['order_id']}: {str(e)}")
-            continue
+    orders = []
+    if page:
+        # Each order's lines grouped in a single pass over the unbuffered (streaming) cursor
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(*seller_order_lines_query([row[0] for row in page], seller_id, status))
+        orders = list(group_order_lines(cursor))
+        cursor.close()
 
-    return render_template('seller_orders.html', orders=processed_orders)
+    return render_template('seller_orders.html', orders=orders, status=status,
+                           statuses=SELLER_ORDER_STATUSES, next_cursor=next_cursor,
+                           is_first_page=not after)
 
-@app.route('/update_order_status', methods=['POST'])
+@bp.route('/update_order_status', methods=['POST'])
 @login_required
 def update_order_status():
     seller_id = session['user_id']
     order_id = request.form.get('order_id')
     new_status = request.form.get('status')
 
+    db = get_db()
     cursor = db.cursor()
     
+    # Move this seller's counters from the old status to the new one
+    seller_stats.seller_status_changing(db, order_id, seller_id, new_status)
+
     # Update only the order items that belong to this seller
     update_query = """
         UPDATE order_items oi
@@ -490,25 +687,26 @@ def update_order_status():
         if result[0]:  # If all items are delivered
             cursor.execute("UPDATE orders SET status = 'Delivered' WHERE id = %s", (order_id,))
             db.commit()
+            cursor.execute("SELECT user_id FROM orders WHERE id = %s", (order_id,))
+            buyer = cursor.fetchone()
+            if buyer:
+                get_cache().invalidate_tags(order_history.orders_tag(buyer[0]))
 
     flash(f'Order #{order_id} status updated to {new_status}.', 'success')
-    return redirect(url_for('seller_orders'))
+    return redirect(url_for('main.seller_orders'))
 
 
 # Buyer Dashboard Route
-@app.route('/buyer_dashboard')
+@bp.route('/buyer_dashboard')
 @login_required
 def buyer_dashboard():
     # Allow both buyers and sellers to access this page
     if session.get('role') not in ['buyer', 'seller']:
         flash('You do not have permission to access this page.', 'danger')
-        return redirect(url_for('index'))
-
-    cursor = db.cursor()
+        return redirect(url_for('main.index'))
 
     # Fetch all categories for the dropdown
-    cursor.execute("SELECT id, name FROM categories")
-    categories = cursor.fetchall()
+    categories = cached_categories()
 
     # Get the selected category ID from query parameters (default is "all")
     category_id = request.args.get('category_id', 'all')
@@ -516,38 +714,15 @@ def buyer_dashboard():
     # Get the search query from query parameters
     search_query = request.args.get('query', '')
 
-    # Fetch products based on the selected category and search query
-    if search_query:
-        if category_id == 'all':
-            cursor.execute("""
-                SELECT * 
-                FROM products 
-                WHERE is_archive = 0 AND (product_name LIKE %s OR size LIKE %s OR price LIKE %s)
-            """, (f"%{search_query}%", f"%{search_query}%", f"%{search_query}%"))
-        else:
-            cursor.execute("""
-                SELECT * 
-                FROM products 
-                WHERE is_archive = 0 AND category_id = %s 
-                AND (product_name LIKE %s OR size LIKE %s)
-            """, (category_id, f"%{search_query}%", f"%{search_query}%"))
-    else:
-        if category_id == 'all':
-            cursor.execute("SELECT * FROM products WHERE is_archive = 0")
-        else:
-            cursor.execute("""
-                SELECT * 
-                FROM products 
-                WHERE is_archive = 0 AND category_id = %s
-            """, (category_id,))
-
-    products = cursor.fetchall()
-
-    # Convert products into dictionaries for easy template rendering
-    column_names = [desc[0] for desc in cursor.description]
-    products_dicts = [dict(zip(column_names, product)) for product in products]
+    # Sort order and keyset cursor for the current page
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in PRODUCT_SORTS:
+        sort = DEFAULT_SORT
+    after = request.args.get('after')
+    per_page = page_size(request.args.get('per_page', DEFAULT_PAGE_SIZE))
 
-    cursor.close()
+    # Fetch one page of products based on the selected category and search query
+    products_dicts, next_cursor = cached_product_page(category_id, search_query, sort, after, per_page)
 
     # Pass products, categories, the selected category, and search query to the template
     return render_template(
@@ -555,30 +730,61 @@ def buyer_dashboard():
         products=products_dicts, 
         categories=categories, 
         selected_category=category_id,  # Pass the selected category
-        search_query=search_query  # Pass the search query
+        search_query=search_query,  # Pass the search query
+        sort=sort,
+        sorts=PRODUCT_SORTS,
+        per_page=per_page,
+        is_first_page=not after,
+        next_cursor=next_cursor
     )
 
 # Seller Registration Form
-@app.route('/seller_registration')
+@bp.route('/seller_registration')
 @login_required
 def seller_registration():
     # Prevent sellers from accessing seller registration
     if session.get('role') == 'seller':
         flash('You are already registered as a seller.', 'warning')
-        return redirect(url_for('buyer_dashboard'))
+        return redirect(url_for('main.buyer_dashboard'))
     
     return render_template('seller_registration.html')
 
 # Seller Registration Submission Route
-def save_file(file):
+# Stores the upload in the blob store and returns its key; the caller adds the
+# reference (blobstore.add_refs) in the transaction that saves the row
+def save_file(file, kinds=ingest.DOCUMENT_KINDS):
     if file:
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        return filename
+        key, _ = ingest.store(file, kinds)
+        return key
     return None
 
-@app.route('/submit_seller_registration', methods=['POST'])
+# Uploads cut off while streaming (too large, wrong type) go back to the form
+@bp.app_errorhandler(RequestEntityTooLarge)
+@bp.app_errorhandler(UnsupportedMediaType)
+def upload_rejected(error):
+    if request.mimetype != 'multipart/form-data':
+        return error
+    flash(error.description, 'danger')
+    return redirect(request.referrer or url_for('main.index'))
+
+# Resized variants and stored dimensions for a new product photo (background pool)
+def process_product_image(filename, category_id):
+    db = get_db()
+    cursor = db.cursor()
+    # Same blob as an existing product: its variants are already there
+    cursor.execute("""
+        SELECT image_width, image_height FROM products
+        WHERE image_path = %s AND image_width IS NOT NULL LIMIT 1
+    """, (filename,))
+    dimensions = cursor.fetchone() or generate_variants(current_app.config['UPLOAD_FOLDER'], filename)
+    if not dimensions:
+        return
+    cursor.execute("UPDATE products SET image_width = %s, image_height = %s WHERE image_path = %s",
+                   (dimensions[0], dimensions[1], filename))
+    db.commit()
+    invalidate_products(category_id)
+
+@bp.route('/submit_seller_registration', methods=['POST'])
 @login_required
 def submit_seller_registration():
     user_id = session['user_id']
@@ -591,25 +797,35 @@ def submit_seller_registration():
     id_proof = request.files.get('id_proof')
     product_photo = request.files.get('product_photo')
 
-    id_proof_filename = save_file(id_proof)
-    product_photo_filename = save_file(product_photo)
+    try:
+        id_proof_filename = save_file(id_proof)
+        product_photo_filename = save_file(product_photo, ingest.IMAGE_KINDS)
+    except ingest.UploadRejected as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.seller_registration'))
 
+    db = get_db()
+    cursor = db.cursor()
     try:
         cursor.execute(""" 
             INSERT INTO seller_requests 
             (user_id, business_name, contact_number, email, id_proof, profile_description, payment_details, product_photo, status)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending')
         """, (user_id, business_name, contact_number, email, id_proof_filename, profile_description, payment_details, product_photo_filename))
+        blobstore.add_refs(db, id_proof_filename, product_photo_filename)
         db.commit()
+        get_cache().invalidate_tags('seller_requests')
         flash('Your seller registration request has been submitted!', 'success')
     except mysql.connector.Error as err:
         flash(f"Error: {err}", 'danger')
     
-    return redirect(url_for('buyer_dashboard'))
+    return redirect(url_for('main.buyer_dashboard'))
 
 #edit product
-@app.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
+@bp.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
 def edit_product(product_id):
+    db = get_db()
+    cursor = db.cursor()
     if request.method == 'GET':
         # Fetch product details
         cursor.execute("SELECT id, product_name, size, pages, stock, price FROM products WHERE id = %s", (product_id,))
@@ -626,19 +842,24 @@ def edit_product(product_id):
         stock = request.form['stock']
         price = request.form['price']
 
+        product = lock_product(cursor, product_id)
         cursor.execute("""
             UPDATE products 
             SET product_name = %s, size = %s, pages = %s, stock = %s, price = %s
             WHERE id = %s
         """, (product_name, size, pages, stock, price, product_id))
+        if product and not product[3]:
+            seller_stats.stock_changed(db, product[0], int(stock) - product[2])
         db.commit()
+        if product:
+            invalidate_product(product_id, product[1])
 
-        return redirect(url_for('seller_dashboard'))  # Redirect to the seller dashboard
+        return redirect(url_for('main.seller_dashboard'))  # Redirect to the seller dashboard
 # add product route
-@app.route('/add_product_page')
+@bp.route('/add_product_page')
 def add_product_page():
     return render_template('add_product.html')
-@app.route('/add_product', methods=['POST'])
+@bp.route('/add_product', methods=['POST'])
 @login_required  # Ensure user is logged in before adding a product
 def add_product():
     if request.method == 'POST':
@@ -654,27 +875,34 @@ def add_product():
     new_category_name = request.form.get('new_category_name')  # For a new category
     image = request.files['image']  # The uploaded image file
 
-    # Handle image upload
-    if image:
-        filename = secure_filename(image.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        image.save(file_path)  # Save the image to the uploads folder
-    else:
-        filename = None  # Handle case where no image is provided
+    # Handle image upload (already streamed to disk; resizing happens in the background)
+    try:
+        filename = save_file(image, ingest.IMAGE_KINDS)
+    except ingest.UploadRejected as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.add_product_page'))
 
+    db = get_db()
+    cursor = db.cursor()
     try:
         # If a new category name is provided, insert it into the categories table and retrieve the ID
         if new_category_name:
             cursor.execute("INSERT INTO categories (name) VALUES (%s)", (new_category_name,))
             db.commit()
             category_id = cursor.lastrowid  # Get the ID of the newly added category
+            get_cache().invalidate_tags('categories')
 
         # Insert the product into the database
         cursor.execute("""
             INSERT INTO products (user_id, product_name, size, pages, stock, price, image_path, category_id)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """, (user_id, product_name, size, pages, stock, price, filename, category_id))
+        blobstore.add_refs(db, filename)
+        seller_stats.stock_changed(db, user_id, int(stock))
         db.commit()
+        invalidate_products(category_id)
+        if filename:
+            submit_background(process_product_image, filename, category_id)
         flash('Product added successfully!', 'success')
     except mysql.connector.Error as err:
         flash(f"Error: {err}", 'danger')
@@ -682,27 +910,15 @@ def add_product():
     return redirect('/seller_dashboard')  # Redirect back to the seller dashboard or another appropriate page
 
 #cart
-@app.route('/cart')
+@bp.route('/cart')
 @login_required
 def cart():
     user_id = session['user_id']  # Ensure you're getting the logged-in user's ID
 
-    cursor = db.cursor()
+    cursor = get_db().cursor()
 
     # Fetch cart items with product details for the logged-in user
-    cursor.execute("""
-        SELECT 
-            ci.product_id AS id,
-            p.product_name AS name,
-            p.price AS price,
-            ci.quantity AS quantity
-        FROM 
-            cart_items ci
-        JOIN 
-            products p ON ci.product_id = p.id
-        WHERE 
-            ci.user_id = %s
-    """, (user_id,))
+    cursor.execute(*carts.cart_page_query(user_id))
 
     cart_items = cursor.fetchall()
 
@@ -723,43 +939,22 @@ def cart():
 
 
 #add to cart
-@app.route('/_cart', methods=['POST'])
+@bp.route('/_cart', methods=['POST'])
 @login_required
 def add_to_cart():
     user_id = session['user_id']
     product_id = request.form.get('product_id')
     quantity = int(request.form.get('quantity', 1))
 
-    cursor = db.cursor()
-
-    # Check if the product is already in the cart
-    cursor.execute("""
-        SELECT id, quantity FROM cart_items 
-        WHERE user_id = %s AND product_id = %s
-    """, (user_id, product_id))
-    cart_item = cursor.fetchone()
-
-    if cart_item:
-        # Update quantity
-        new_quantity = cart_item[1] + quantity
-        cursor.execute("""
-            UPDATE cart_items 
-            SET quantity = %s 
-            WHERE id = %s
-        """, (new_quantity, cart_item[0]))
-    else:
-        # Add new cart item
-        cursor.execute("""
-            INSERT INTO cart_items (user_id, product_id, quantity)
-            VALUES (%s, %s, %s)
-        """, (user_id, product_id, quantity))
-
+    # One upsert: a double-click adds to the same line instead of racing to insert two
+    db = get_db()
+    carts.add(db, user_id, product_id, quantity)
     db.commit()
     flash('Product added to cart.', 'success')
-    return redirect(url_for('cart'))
+    return redirect(url_for('main.cart'))
 
 #update cart
-@app.route('/update_cart', methods=['POST'])
+@bp.route('/update_cart', methods=['POST'])
 @login_required
 def update_cart():
     # Get form data
@@ -768,56 +963,74 @@ def update_cart():
 
     if not product_id or not quantity:
         flash('Invalid data provided.', 'danger')
-        return redirect(url_for('view_cart'))
+        return redirect(url_for('main.cart'))
 
     # Update the cart item in the database
+    db = get_db()
     try:
-        cursor = db.cursor()
-        cursor.execute("""
-            UPDATE cart_items 
-            SET quantity = %s 
-            WHERE product_id = %s AND user_id = %s
-        """, (quantity, product_id, session['user_id']))
+        carts.apply_changes(db, session['user_id'], carts.parse_changes([{'product_id': product_id, 'quantity': quantity}]))
         db.commit()
-        cursor.close()
         flash('Cart updated successfully.', 'success')
+    except carts.InvalidChange as e:
+        flash(str(e), 'danger')
     except Exception as e:
         db.rollback()
         flash(f'Error updating cart: {e}', 'danger')
 
-    return redirect(url_for('cart'))
+    return redirect(url_for('main.cart'))
 
 #remove from cart
-@app.route('/remove_from_cart', methods=['POST'])
+@bp.route('/remove_from_cart', methods=['POST'])
 @login_required
 def remove_from_cart():
     product_id = request.form.get('product_id')
 
     if not product_id:
         flash('Invalid product ID.', 'danger')
-        return redirect(url_for('cart'))
+        return redirect(url_for('main.cart'))
 
+    db = get_db()
     try:
-        cursor = db.cursor()
-        cursor.execute("""
-            DELETE FROM cart_items 
-            WHERE product_id = %s AND user_id = %s
-        """, (product_id, session['user_id']))
+        carts.apply_changes(db, session['user_id'], carts.parse_changes([{'product_id': product_id, 'quantity': 0}]))
         db.commit()
-        cursor.close()
         flash('Item removed from cart.', 'success')
+    except carts.InvalidChange as e:
+        flash(str(e), 'danger')
     except Exception as e:
         db.rollback()
         flash(f'Error removing item: {e}', 'danger')
 
-    return redirect(url_for('cart'))
+    return redirect(url_for('main.cart'))
+
+# Batch cart update used by the cart page: {"changes": [{"product_id": 3, "quantity": 2}, ...]}
+# in one transaction (quantity 0 removes the line); returns the updated cart as JSON
+@bp.route('/cart/batch', methods=['POST'])
+def batch_update_cart():
+    if 'user_id' not in session:
+        return jsonify({'message': 'User not logged in!'}), 401
+    user_id = session['user_id']
+    payload = request.get_json(silent=True) or {}
+    try:
+        changes = carts.parse_changes(payload.get('changes'))
+    except carts.InvalidChange as e:
+        return jsonify({'message': str(e)}), 400
+
+    db = get_db()
+    try:
+        carts.apply_changes(db, user_id, changes)
+        db.commit()
+    except mysql.connector.Error:
+        db.rollback()
+        current_app.logger.exception('Batch cart update failed for user %s', user_id)
+        return jsonify({'message': 'An error occurred updating the cart.'}), 500
+    return jsonify(carts.summary(db, user_id))
 
 #checkout
-@app.route('/checkout', methods=['GET', 'POST'])
+@bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
     user_id = session['user_id']
-    cursor = db.cursor(dictionary=True)
+    cursor = get_db().cursor(dictionary=True)
 
     if request.method == 'POST':
         # Get selected items from form
@@ -825,33 +1038,18 @@ def checkout():
         
         # Fetch only selected cart items
         if selected_items:
-            # Create placeholders for SQL IN clause
-            placeholders = ', '.join(['%s'] * len(selected_items))
-            query = f"""
-                SELECT c.product_id, c.quantity, p.product_name, p.price, (c.quantity * p.price) as total 
-                FROM cart_items c
-                JOIN products p ON c.product_id = p.id
-                WHERE c.user_id = %s AND c.product_id IN ({placeholders})
-            """
-            # Create parameters tuple with user_id and selected items
-            params = (user_id,) + tuple(selected_items)
-            cursor.execute(query, params)
+            cursor.execute(*carts.checkout_lines_query(user_id, selected_items))
         else:
-            return redirect(url_for('cart'))
+            return redirect(url_for('main.cart'))
     else:
         # If GET request, fetch all cart items
-        cursor.execute("""
-            SELECT c.product_id, c.quantity, p.product_name, p.price, (c.quantity * p.price) as total 
-            FROM cart_items c
-            JOIN products p ON c.product_id = p.id
-            WHERE c.user_id = %s
-        """, (user_id,))
+        cursor.execute(*carts.checkout_lines_query(user_id))
 
     cart_items = cursor.fetchall()
     
     if not cart_items:
         flash('No items selected for checkout', 'warning')
-        return redirect(url_for('cart'))
+        return redirect(url_for('main.cart'))
 
     # Calculate total price of selected items
     total_price = sum(item['total'] for item in cart_items)
@@ -860,81 +1058,104 @@ def checkout():
     cursor.execute("SELECT id, address FROM addresses WHERE user_id = %s", (user_id,))
     addresses = cursor.fetchall()
 
+    # Signed record of exactly these lines and prices; place_order charges from it
+    snapshot = carts.create_snapshot(user_id, cart_items)
+
     return render_template('checkout.html', 
                          cart_items=cart_items,
                          addresses=addresses, 
-                         total_price=total_price)
+                         total_price=total_price,
+                         snapshot=snapshot)
 
 # place order
-@app.route('/place_order', methods=['POST'])
+@bp.route('/place_order', methods=['POST'])
 @login_required
 def place_order():
     user_id = session['user_id']
     address_id = request.form.get('address_id')
     payment_method = request.form.get('payment_method')
 
-    cursor = db.cursor(dictionary=True)
+    # The lines and prices the buyer confirmed on the checkout page
+    try:
+        lines = carts.load_snapshot(request.form.get('snapshot'), user_id)
+    except carts.InvalidSnapshot as e:
+        flash(str(e), "error")
+        return redirect(url_for('main.cart'))
+
+    db = get_db()
+    cursor = db.cursor()
 
     try:
         # Start transaction
         cursor.execute("START TRANSACTION")
 
-        # Create the order
+        # Consume the lines from the cart first: a resubmitted or replayed
+        # snapshot finds them gone (or waits on their locks) and is refused
+        placeholders = ', '.join(['%s'] * len(lines))
+        cursor.execute(f"""
+            DELETE FROM cart_items
+            WHERE user_id = %s AND product_id IN ({placeholders})
+        """, [user_id] + [product_id for product_id, _, _ in lines])
+        if cursor.rowcount != len(lines):
+            cursor.execute("ROLLBACK")
+            flash("Your cart has changed since checkout. Please review your order again.", "error")
+            return redirect(url_for('main.cart'))
+
+        # Take the stock, locking the products in id order and checking each price
+        out_of_stock, repriced = inventory.reserve_lines(db, lines)
+        if out_of_stock or repriced:
+            cursor.execute("ROLLBACK")
+            if out_of_stock:
+                flash(f"Not enough stock for: {', '.join(out_of_stock)}", "error")
+            if repriced:
+                flash(f"The price has changed for: {', '.join(repriced)}. Please review your order again.", "error")
+            return redirect(url_for('main.cart'))
+
+        # Create the order and its lines at the confirmed prices; the total is
+        # summed from those verified lines, never taken from the token
+        total_amount = sum((price * quantity for _, quantity, price in lines), Decimal(0))
         cursor.execute("""
             INSERT INTO orders (user_id, address_id, payment_method, status, total_amount)
-            VALUES (%s, %s, %s, 'Pending', 0)
-        """, (user_id, address_id, payment_method))
+            VALUES (%s, %s, %s, 'Pending', %s)
+        """, (user_id, address_id, payment_method, total_amount))
         order_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+        """, [(order_id, product_id, quantity, price) for product_id, quantity, price in lines])
 
-        # Get selected items from cart and insert into order_items
-        cursor.execute("""
-            SELECT c.product_id, c.quantity, p.price
-            FROM cart_items c
-            JOIN products p ON c.product_id = p.id
-            WHERE c.user_id = %s
-        """, (user_id,))
-        cart_items = cursor.fetchall()
-
-        total_amount = 0
-        for item in cart_items:
-            cursor.execute("""
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            """, (order_id, item['product_id'], item['quantity'], item['price']))
-            total_amount += item['quantity'] * item['price']
-
-        # Update order total
-        cursor.execute("UPDATE orders SET total_amount = %s WHERE id = %s", 
-                      (total_amount, order_id))
-
-        # Remove purchased items from cart
-        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+        # Count the new order on each seller's dashboard
+        seller_stats.order_placed(db, order_id)
 
         # Commit transaction
         cursor.execute("COMMIT")
+        get_cache().invalidate_tags(order_history.orders_tag(user_id))
         flash("Order placed successfully!", "success")
-        return redirect(url_for('orders_dashboard'))
+        return redirect(url_for('main.orders_dashboard'))
 
     except Exception as e:
         cursor.execute("ROLLBACK")
         flash(f"Error placing order: {str(e)}", "error")
-        return redirect(url_for('checkout'))
+        return redirect(url_for('main.cart'))
 
 
-@app.route('/uploads/<filename>')
+@bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return file_delivery.send(current_app.config['UPLOAD_FOLDER'], filename)
 
 #add category
-@app.route('/add_category', methods=['POST'])
+@bp.route('/add_category', methods=['POST'])
 def add_category():
     new_category = request.json.get('category_name')  # Expecting JSON payload
     if not new_category:
         return jsonify({"error": "Category name is required"}), 400
 
+    db = get_db()
+    cursor = db.cursor()
     try:
         cursor.execute("INSERT INTO categories (name) VALUES (%s)", (new_category,))
         db.commit()
+        get_cache().invalidate_tags('categories')
 
         # Retrieve the ID of the newly inserted category
         new_category_id = cursor.lastrowid
@@ -943,101 +1164,177 @@ def add_category():
         return jsonify({"error": str(err)}), 500
 
 
-@app.route('/categories', methods=['GET'])
+@bp.route('/categories', methods=['GET'])
 def get_categories():
-    cursor.execute("SELECT * FROM categories")
-    categories = cursor.fetchall()
+    categories = cached_categories()
     category_list = [{'id': category[0], 'name': category[1]} for category in categories]
     return jsonify(category_list)
+
+# Read-only JSON catalog: cursor pages of products with ?fields= projection
+def api_response(body, etag):
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True  # revalidate with If-None-Match
+    return response.make_conditional(request)
+
+def api_error(message, status=400):
+    return jsonify({'error': message}), status
+
+def api_product_item(row, fields):
+    return catalog_api.serialize(row, fields, lambda filename, width: upload_url(filename), image_srcset)
+
+@bp.route('/api/products')
+def api_products():
+    try:
+        fields = catalog_api.parse_fields(request.args.get('fields'))
+    except catalog_api.InvalidParameter as e:
+        return api_error(str(e))
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in PRODUCT_SORTS:
+        return api_error(f'Unknown sort: {sort}')
+    category_id = request.args.get('category_id', 'all')
+    search_query = request.args.get('q', '').strip()
+    after = request.args.get('after')
+    per_page = page_size(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+
+    def load():
+        cursor = get_db().cursor(dictionary=True)
+        rows, next_cursor = fetch_product_page(cursor, category_id, search_query, sort, after, per_page,
+                                               columns=catalog_api.select_columns(fields, sort))
+        cursor.close()
+        # The body is cached under the parsed parameters, so the link is built from
+        # those alone; other query args must not end up in the cached body
+        next_url = None
+        if next_cursor:
+            next_url = url_for('main.api_products', category_id=category_id, q=search_query or None, sort=sort,
+                               per_page=per_page, fields=','.join(fields), after=next_cursor)
+        return catalog_api.encode({
+            'data': [api_product_item(row, fields) for row in rows],
+            'next_cursor': next_cursor,
+            'next': next_url,
+        })
+
+    cache_key = 'api:products:' + json.dumps([category_id, search_query, sort, after, per_page, fields])
+    body, etag = get_cache().get_or_set(cache_key, load, tags=(product_list_tag(category_id),))
+    return api_response(body, etag)
+
+@bp.route('/api/products/<int:product_id>')
+def api_product(product_id):
+    try:
+        fields = catalog_api.parse_fields(request.args.get('fields'))
+    except catalog_api.InvalidParameter as e:
+        return api_error(str(e))
+
+    def load():
+        cursor = get_db().cursor(dictionary=True)
+        cursor.execute(f"SELECT {catalog_api.select_columns(fields)} FROM products WHERE id = %s AND is_archive = 0",
+                       (product_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        return catalog_api.encode({'data': api_product_item(row, fields)}) if row else None
+
+    cache_key = f'api:product:{product_id}:' + ','.join(fields)
+    result = get_cache().get_or_set(cache_key, load, tags=('products:all', product_tag(product_id)))
+    if result is None:
+        return api_error('Product not found', 404)
+    return api_response(*result)
     
 # Logout Route
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 # orders dashboard Routes
-@app.route('/orders_dashboard')
+@bp.route('/orders_dashboard')
 def orders_dashboard():
     # Retrieve the user_id from session (after login)
     user_id = session.get('user_id')
 
     if not user_id:
         flash('Please log in first.', 'login-warning')
-        return redirect(url_for('login'))  # Redirect to login if no user_id is found in 
+        return redirect(url_for('main.login'))  # Redirect to login if no user_id is found in 
     
-    db = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="ecommerce_db_backup"
-    )
-
-    cursor = db.cursor(dictionary=True)
+    # One status tab at a time, paged in SQL (newest first)
+    status = request.args.get('status', 'Pending')
+    if status not in order_history.ORDER_STATUSES:
+        status = 'Pending'
+    after = request.args.get('after')
+
+    cursor = get_db().cursor(dictionary=True)
+    orders, next_cursor = order_history.fetch_orders_page(cursor, user_id, status, after)
+    cursor.close()
 
-    # Fetch all orders for the user, including product details
-    cursor.execute("""
-    SELECT o.id AS order_id, o.status, o.total_amount, o.created_at, 
-           p.product_name, p.size, p.pages, oi.quantity 
-    FROM orders o
-    JOIN order_items oi ON o.id = oi.order_id
-    JOIN products p ON oi.product_id = p.id
-    WHERE o.user_id = %s
-    """, (user_id,))
-    orders = cursor.fetchall()
-
-    # Separate orders into sections based on status
-    pending_orders = [order for order in orders if order['status'] == 'Pending']
-    shipped_orders = [order for order in orders if order['status'] == 'Shipped']
-    delivered_orders = [order for order in orders if order['status'] == 'Delivered']
-    cancelled_orders = [order for order in orders if order['status'] == 'Cancelled']
-
-    # Return the template and pass the orders data
-    return render_template('orders_dashboard.html', 
-                           pending_orders=pending_orders,
-                           shipped_orders=shipped_orders,
-                           delivered_orders=delivered_orders,
-                           cancelled_orders=cancelled_orders)
-
-@app.route('/cancel_order/<int:order_id>', methods=['POST'])
+    # Tab counts, refreshed whenever one of the user's orders changes status
+    def load_counts():
+        counts_cursor = get_db().cursor()
+        counts = order_history.count_by_status(counts_cursor, user_id)
+        counts_cursor.close()
+        return counts
+    counts = get_cache().get_or_set(f'orders:counts:{user_id}', load_counts,
+                                    tags=(order_history.orders_tag(user_id),))
+
+    return render_template('orders_dashboard.html',
+                           orders=orders,
+                           status=status,
+                           statuses=order_history.ORDER_STATUSES,
+                           counts=counts,
+                           next_cursor=next_cursor,
+                           is_first_page=not after)
+
+@bp.route('/cancel_order/<int:order_id>', methods=['POST'])
 @login_required
 def cancel_order(order_id):
+    db = get_db()
     cursor = db.cursor()
 
-    # Print the order ID to ensure it's correct
-    print(f"Cancelling order with ID: {order_id}")
+    current_app.logger.info('Cancelling order %s for user %s', order_id, session['user_id'])
 
-    # Update the order status to 'Cancelled' in the database
-    cursor.execute("UPDATE orders SET status = 'Cancelled' WHERE id = %s", (order_id,))
-    db.commit()
+    try:
+        # Lock the order so a double submit cannot restock it twice
+        cursor.execute("SELECT status, user_id FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+        order = cursor.fetchone()
+
+        if order and order[0] != 'Cancelled':
+            # Put the stock back first: release_order locks the products in id
+            # order, so the counter updates below only touch rows already held
+            inventory.release_order(db, order_id)
+            seller_stats.order_cancelling(db, order_id)
+
+            # Update the order status to 'Cancelled' in the database
+            cursor.execute("UPDATE orders SET status = 'Cancelled' WHERE id = %s", (order_id,))
+        db.commit()
+    except mysql.connector.Error:
+        db.rollback()
+        current_app.logger.exception('Cancelling order %s failed', order_id)
+        flash('Your order could not be cancelled. Please try again.', 'danger')
+        return redirect(url_for('main.orders_dashboard'))
+    finally:
+        cursor.close()
+    if order:
+        get_cache().invalidate_tags(order_history.orders_tag(order[1]))
 
     flash('Your order has been cancelled.', 'success')
-    return redirect(url_for('orders_dashboard'))
+    return redirect(url_for('main.orders_dashboard'))
 
 #addresess dashboard
-@app.route('/addresses_dashboard')
+@bp.route('/addresses_dashboard')
 def addresses_dashboard():
     user_id = session.get('user_id')  # Ensure the logged-in user's ID is retrieved
     if not user_id:
         return redirect('/login')
 
-    conn = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='',
-        database='ecommerce_db_backup'
-    )
-    cursor = conn.cursor(dictionary=True)
+    cursor = get_db().cursor(dictionary=True)
 
     # Fetch addresses for the logged-in user
     cursor.execute("SELECT id, name, address, phone FROM addresses WHERE user_id = %s", (user_id,))
     addresses = cursor.fetchall()
 
-    conn.close()
     return render_template('addresses_dashboard.html', addresses=addresses)
 
 #add address
-@app.route('/add_address', methods=['GET', 'POST'])
+@bp.route('/add_address', methods=['GET', 'POST'])
 def add_address():
     if request.method == 'POST':
         # Get data from the form
@@ -1050,22 +1347,26 @@ def add_address():
 
         if user_id:
             # Insert the data into the addresses table
+            db = get_db()
+            cursor = db.cursor()
             cursor.execute("INSERT INTO addresses (user_id, name, address, phone) VALUES (%s, %s, %s, %s)",
                            (user_id, name, address, phone))
             db.commit()
 
             # Redirect to address dashboard or another page
-            return redirect(url_for('addresses_dashboard'))
+            return redirect(url_for('main.addresses_dashboard'))
         else:
-            return redirect(url_for('login'))  # If not logged in, redirect to login page
+            return redirect(url_for('main.login'))  # If not logged in, redirect to login page
 
     return render_template('add_address.html')
 
 #delete address
-@app.route('/delete_address/<int:address_id>', methods=['POST'])
+@bp.route('/delete_address/<int:address_id>', methods=['POST'])
 def delete_address(address_id):
     user_id = session.get('user_id')  # Ensure the user is logged in
     if user_id:
+        db = get_db()
+        cursor = db.cursor()
         try:
             # Delete the address from the database
             cursor.execute("DELETE FROM addresses WHERE id = %s AND user_id = %s", (address_id, user_id))
@@ -1077,23 +1378,24 @@ def delete_address(address_id):
     else:
         flash("You must be logged in to delete addresses.", "warning")
     
-    return redirect(url_for('addresses_dashboard'))
+    return redirect(url_for('main.addresses_dashboard'))
 
 
-@app.route('/account_settings_dashboard')
+@bp.route('/account_settings_dashboard')
 @login_required
 def account_settings_dashboard():
     # Only allow buyers to access account settings from buyer dashboard
     if session.get('role') == 'seller':
         flash('Please use the seller dashboard for account settings.', 'warning')
-        return redirect(url_for('buyer_dashboard'))
+        return redirect(url_for('main.buyer_dashboard'))
     
     user_id = session.get('user_id')
+    cursor = get_db().cursor()
     cursor.execute("SELECT name, email FROM users WHERE id = %s", (user_id,))
     user = cursor.fetchone()
     return render_template('account_settings_dashboard.html', user=user)
 
-@app.route('/update-profile', methods=['POST'])
+@bp.route('/update-profile', methods=['POST'])
 def update_profile():
     if 'user_id' not in session:
         return jsonify({'message': 'User not logged in!'}), 401
@@ -1106,18 +1408,19 @@ def update_profile():
     if not name or not email:
         return jsonify({'message': 'Name and email are required!'}), 400
 
+    db = get_db()
+    cursor = db.cursor()
     try:
-        cursor = db.cursor()
         cursor.execute("UPDATE users SET name = %s, email = %s WHERE id = %s", (name, email, user_id))
         db.commit()
         return jsonify({'message': 'Profile updated successfully!'})
-    except mysql.connector.Error as err:
-        print(err)
+    except mysql.connector.Error:
+        current_app.logger.exception('Updating profile of user %s failed', user_id)
         return jsonify({'message': 'An error occurred updating the profile.'}), 500
     finally:
         cursor.close()
 
-@app.route('/change-password', methods=['POST'])
+@bp.route('/change-password', methods=['POST'])
 def change_password():
     if 'user_id' not in session:
         return jsonify({'message': 'User not logged in!'}), 401
@@ -1129,59 +1432,68 @@ def change_password():
     if not current_password or not new_password:
         return jsonify({'message': 'Both current and new passwords are required!'}), 400
 
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
     try:
-        cursor = db.cursor(dictionary=True)
         user_id = session['user_id']
 
         # Fetch the current hashed password from the database
         cursor.execute("SELECT password FROM users WHERE id = %s", (user_id,))
         user = cursor.fetchone()
 
-        if not user or not check_password_hash(user['password'], current_password):
+        passwords.throttle(ip=request.remote_addr, account=f'user:{user_id}')
+        if not user or not passwords.verify_password(user['password'], current_password):
             return jsonify({'message': 'Current password is incorrect!'}), 403
 
         # Hash the new password
-        hashed_password = generate_password_hash(new_password)
+        hashed_password = passwords.hash_password(new_password)
 
         # Update the password in the database
-        cursor.execute("UPDATE users SET password = %s WHERE id = %s", (hashed_password, user_id))
+        cursor.execute("UPDATE users SET password = %s, password_fingerprint = %s WHERE id = %s",
+                       (hashed_password, password_fingerprint(new_password), user_id))
         db.commit()
 
         return jsonify({'message': 'Password changed successfully!'})
-    except mysql.connector.Error as err:
-        print(err)
+    except IntegrityError:
+        db.rollback()
+        return jsonify({'message': 'This password is already in use. Please choose a different password.'}), 400
+    except passwords.Rejected as e:
+        return jsonify({'message': e.message}), e.status, {'Retry-After': str(e.retry_after)}
+    except mysql.connector.Error:
+        current_app.logger.exception('Changing password of user %s failed', user_id)
         return jsonify({'message': 'An error occurred while changing the password.'}), 500
     finally:
         cursor.close()
 
-@app.route('/update_seller_account', methods=['POST'])
+@bp.route('/update_seller_account', methods=['POST'])
 @login_required
 def update_seller_account():
     if request.method == 'POST':
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
         try:
             # Get form data
             new_name = request.form['name']
             new_email = request.form['email']
             new_password = request.form['password']
             
-            cursor = db.cursor(dictionary=True)
-            
             # Check if email already exists (excluding current user)
             cursor.execute("SELECT id FROM users WHERE email = %s AND id != %s", 
                          (new_email, session['user_id']))
             if cursor.fetchone():
                 flash('Email already exists!', 'account_error')  # Changed category
-                return redirect(url_for('seller_account_settings'))
+                return redirect(url_for('main.seller_account_settings'))
             
             # Update query
             if new_password:
                 # Update with new password
-                hashed_password = generate_password_hash(new_password)
+                passwords.throttle(ip=request.remote_addr, account=f"user:{session['user_id']}")
+                hashed_password = passwords.hash_password(new_password)
                 cursor.execute("""
                     UPDATE users 
-                    SET name = %s, email = %s, password = %s 
+                    SET name = %s, email = %s, password = %s, password_fingerprint = %s 
                     WHERE id = %s
-                """, (new_name, new_email, hashed_password, session['user_id']))
+                """, (new_name, new_email, hashed_password, password_fingerprint(new_password), session['user_id']))
             else:
                 # Update without changing password
                 cursor.execute("""
@@ -1197,29 +1509,324 @@ def update_seller_account():
             session['email'] = new_email
             
             flash('Account settings updated successfully!', 'account_success')  # Changed category
-            
-        except Exception as e:
+
+        except IntegrityError as e:
+            db.rollback()
+            if 'password_fingerprint' in str(e):
+                flash('This password is already in use. Please choose a different password.', 'account_error')
+            else:
+                flash('Email already exists!', 'account_error')
+
+        except passwords.Rejected as e:
+            db.rollback()
+            flash(e.message, 'account_error')
+
+        except Exception:
             db.rollback()
-            print(f"Error: {str(e)}")
+            current_app.logger.exception('Updating seller account %s failed', session['user_id'])
             flash('An error occurred while updating your account.', 'account_error')  # Changed category
             
         finally:
             cursor.close()
             
-    return redirect(url_for('seller_account_settings'))
+    return redirect(url_for('main.seller_account_settings'))
 
-@app.route('/privacy-policy')
+@bp.route('/privacy-policy')
 def privacy_policy():
     return render_template('privacy-policy.html')
 
-@app.route('/terms-of-service')
+@bp.route('/terms-of-service')
 def terms_of_service():
     return render_template('terms-of-service.html')
 
-@app.route('/contact', methods=['GET', 'POST'])
+@bp.route('/contact', methods=['GET', 'POST'])
 def contact():
     return render_template('contact.html')
 
+# Seller stats maintenance: flask --app 'app:create_app()' seller-stats rebuild|verify
+seller_stats_cli = AppGroup('seller-stats', help='Rebuild or verify the seller_stats table.')
+
+@seller_stats_cli.command('rebuild')
+@click.option('--seller-id', type=int, help='Only rebuild this seller.')
+def rebuild_seller_stats(seller_id):
+    db = get_db()
+    seller_stats.rebuild(db, seller_id)
+    db.commit()
+    click.echo('Seller stats rebuilt.')
+
+@seller_stats_cli.command('verify')
+def verify_seller_stats():
+    mismatches = seller_stats.verify(get_db())
+    for seller_id, column, actual, expected in mismatches:
+        click.echo(f'seller {seller_id}: {column} is {actual}, expected {expected}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Seller stats match the order and product tables.')
+
+# Generate resized variants for existing product images: flask --app 'app:create_app()' images generate
+images_cli = AppGroup('images', help='Manage resized product image variants.')
+
+@images_cli.command('generate')
+@click.option('--force', is_flag=True, help='Regenerate images that already have variants.')
+def generate_image_variants(force):
+    db = get_db()
+    cursor = db.cursor()
+    query = "SELECT DISTINCT image_path FROM products WHERE image_path IS NOT NULL"
+    if not force:
+        query += " AND image_width IS NULL"
+    cursor.execute(query)
+    for (filename,) in cursor.fetchall():
+        dimensions = generate_variants(current_app.config['UPLOAD_FOLDER'], filename)
+        if dimensions is None:
+            click.echo(f'skipped {filename}')
+            continue
+        cursor.execute("UPDATE products SET image_width = %s, image_height = %s WHERE image_path = %s",
+                       dimensions + (filename,))
+        db.commit()
+        click.echo(f'{filename}: {dimensions[0]}x{dimensions[1]}')
+    get_cache().invalidate_tags('products:all')
+
+# Content-addressed upload store maintenance: flask --app 'app:create_app()' blobs gc
+blobs_cli = AppGroup('blobs', help='Manage the content-addressed upload store.')
+
+@blobs_cli.command('rebuild')
+def rebuild_blob_refs():
+    db = get_db()
+    blobstore.rebuild(db)
+    db.commit()
+    click.echo('Blob reference counts rebuilt.')
+
+@blobs_cli.command('gc')
+@click.option('--grace-hours', type=float, default=24, show_default=True,
+              help='Keep unreferenced blobs younger than this (uploads still being saved).')
+@click.option('--dry-run', is_flag=True, help='List what would be deleted.')
+def collect_blobs(grace_hours, dry_run):
+    removed = blobstore.gc(get_db(), current_app.config['UPLOAD_FOLDER'], grace_hours * 3600, dry_run)
+    for key, size in removed:
+        click.echo(f'{key} ({size} bytes)')
+    verb = 'Would free' if dry_run else 'Freed'
+    click.echo(f'{verb} {sum(size for _, size in removed)} bytes in {len(removed)} blobs.')
+
+# Move uploads referenced by flat filename into the store and repoint the rows
+@blobs_cli.command('import')
+def import_blobs():
+    db = get_db()
+    cursor = db.cursor()
+    folder = current_app.config['UPLOAD_FOLDER']
+    cursor.execute(f"""
+        SELECT DISTINCT blob_key FROM ({blobstore.REFERENCES_QUERY}) r
+        WHERE blob_key IS NOT NULL AND blob_key != '' AND blob_key NOT LIKE 'blobs/%'
+    """)
+    for (filename,) in cursor.fetchall():
+        path = os.path.join(folder, filename)
+        if not os.path.isfile(path):
+            click.echo(f'missing {filename}')
+            continue
+        with open(path, 'rb') as f:
+            kind = ingest.sniff(f.read(ingest.SNIFF_LENGTH))
+        if kind is None:
+            click.echo(f'skipped {filename}')
+            continue
+        key = blobstore.import_file(folder, filename, kind)
+        cursor.execute("UPDATE products SET image_path = %s, image_width = NULL, image_height = NULL WHERE image_path = %s",
+                       (key, filename))
+        cursor.execute("UPDATE seller_requests SET id_proof = %s WHERE id_proof = %s", (key, filename))
+        cursor.execute("UPDATE seller_requests SET product_photo = %s WHERE product_photo = %s", (key, filename))
+        db.commit()
+        click.echo(f'{filename} -> {key}')
+    blobstore.rebuild(db)
+    db.commit()
+    get_cache().invalidate_tags('products:all')
+    click.echo('The flat files are left in place. Run `flask --app "app:create_app()" images generate` for the moved product images.')
+
+# Schema migrations and query plan checks: flask --app 'app:create_app()' db migrate|status|stamp|explain
+db_cli = AppGroup('db', help='Apply schema migrations and check query plans.')
+
+@db_cli.command('migrate')
+@click.option('--target', type=int, help='Stop after this migration version.')
+def migrate_db(target):
+    applied = migrations.migrate(get_db(), target,
+                                 on_apply=lambda version, name: click.echo(f'Applying {version:03d}_{name}'))
+    click.echo(f'{len(applied)} migration(s) applied.' if applied else 'Schema is up to date.')
+
+@db_cli.command('status')
+def migration_status():
+    done = migrations.applied_versions(get_db())
+    for version, name, _ in migrations.discover():
+        click.echo(f"{'applied' if version in done else 'pending':8} {version:03d}_{name}")
+
+# For databases migrated by hand before the runner existed
+@db_cli.command('stamp')
+@click.argument('version', type=int)
+def stamp_db(version):
+    stamped = migrations.stamp(get_db(), version)
+    click.echo(f'Marked {len(stamped)} migration(s) as applied.')
+
+@db_cli.command('explain')
+@click.option('--min-rows', type=int, default=query_plans.DEFAULT_MIN_ROWS, show_default=True,
+              help='Ignore scans and sorts estimated below this many rows.')
+@click.option('--verbose', is_flag=True, help='Print every plan, not just the failures.')
+def explain_queries(min_rows, verbose):
+    results = query_plans.check(current_app._get_current_object(), min_rows)
+    failed = [result for result in results if result['failed']]
+    for result in results:
+        if not (verbose or result['failed']):
+            continue
+        click.echo(f"{'FAIL' if result['failed'] else 'ok':4} {result['source']}: {result['statement'][:160]}")
+        for problem in result['problems']:
+            click.echo(f'       {problem}')
+        if verbose:
+            for row in result['plan']:
+                click.echo(f"       {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                           f"rows={row.get('rows')} {row.get('Extra') or ''}")
+    click.echo(f'{len(results)} statements explained, {len(failed)} with a full scan or filesort.')
+    if failed:
+        raise SystemExit(1)
+
+DEV_SECRET_KEY = 'your_secret_key'
+
+# Configure and initialize the app: the defaults below, then MEMORIEO_* environment
+# variables (MEMORIEO_MYSQL_HOST=db1, MEMORIEO_DB_POOL_SIZE=10; values are parsed as
+# JSON when they can be), then `config`. Nothing connects to MySQL or starts a
+# thread or process here: pools open on first use in the process that uses them,
+# so a server can fork its workers after create_app(). Every call returns a new,
+# independent app with its own pools and caches.
+def create_app(config=None):
+    started = time.perf_counter()
+    app = Flask(__name__)
+
+    # Sessions, flashes and signed checkout snapshots; set MEMORIEO_SECRET_KEY in production
+    app.config['SECRET_KEY'] = DEV_SECRET_KEY
+
+    # Upload folder, relative to the working directory
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+
+    # Uploads are streamed to disk and cut off at these sizes; see ingest.py
+    app.config['UPLOAD_MAX_FILE_SIZE'] = 10 * 1024 * 1024  # per file
+    app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024    # whole request
+
+    # Background pool for upload post-processing; see background.py
+    app.config['BACKGROUND_WORKERS'] = 2
+    app.config['BACKGROUND_QUEUE_SIZE'] = 32
+
+    # Hand upload bodies to the front server (Apache mod_xsendfile, lighttpd) instead
+    # of streaming them from Python; see file_delivery.py
+    app.config['USE_X_SENDFILE'] = False
+
+    # MySQL connection pool settings
+    app.config['MYSQL_HOST'] = 'localhost'
+    app.config['MYSQL_USER'] = 'root'
+    app.config['MYSQL_PASSWORD'] = ''
+    app.config['MYSQL_DATABASE'] = 'ecommerce_db_backup'
+    app.config['DB_POOL_SIZE'] = 5           # connections kept open between requests
+    app.config['DB_POOL_MAX_OVERFLOW'] = 10  # extra connections allowed during bursts
+    app.config['DB_POOL_TIMEOUT'] = 30       # seconds to wait for a free connection
+    app.config['DB_POOL_RECYCLE'] = 3600     # reconnect connections older than this
+    app.config['DB_POOL_PRE_PING'] = True    # ping connections before handing them out
+
+    # Per-request query counts and DB time, latency histograms and pool numbers on /metrics
+    app.config['SQL_N_PLUS_ONE_THRESHOLD'] = 10  # same statement this many times in one request gets logged
+    # /metrics is refused unless one of these is set: a scraper token sent as
+    # "Authorization: Bearer <token>" (MEMORIEO_METRICS_TOKEN), or addresses
+    # allowed without one (MEMORIEO_METRICS_ALLOWED_IPS='["10.0.0.5"]')
+    app.config['METRICS_TOKEN'] = None
+    app.config['METRICS_ALLOWED_IPS'] = ()
+
+    # Read-through cache for catalog and category queries
+    app.config['CACHE_MAX_ENTRIES'] = 1024  # LRU bound for the in-process cache
+    app.config['CACHE_DEFAULT_TTL'] = 300   # seconds
+    app.config['CACHE_REDIS_URL'] = None    # e.g. redis://localhost:6379/0 to share the cache between workers
+
+    # Compiled templates on disk and cached product grid cards (see fragments.py)
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')  # None to disable
+    app.config['FRAGMENT_CACHE_TTL'] = 3600  # seconds
+
+    # Optional async mode (asgi.py): aiomysql pool for the async pages, threads for the rest
+    app.config['ASYNC_DB_POOL_SIZE'] = 20
+    app.config['ASYNC_WSGI_THREADS'] = 10
+
+    # How long a priced checkout snapshot can be used to place the order
+    app.config['CHECKOUT_SNAPSHOT_TTL'] = 900  # seconds
+
+    # Password hashing in a process pool with per-IP/per-account throttles; see passwords.py
+    app.config['PASSWORD_HASH_WORKERS'] = 2                # processes; 0 hashes on the request thread
+    app.config['PASSWORD_HASH_QUEUE_SIZE'] = 8             # hashes allowed to wait before attempts are refused
+    app.config['PASSWORD_HASH_TIMEOUT'] = 5                # seconds to wait for a hash
+    app.config['LOGIN_ATTEMPTS_PER_IP'] = (30, 60)         # attempts per window in seconds
+    app.config['LOGIN_ATTEMPTS_PER_ACCOUNT'] = (10, 300)
+    app.config['SIGNUP_ATTEMPTS_PER_IP'] = (10, 600)       # signups, counted apart from logins
+
+    # Reverse proxies in front of the app that append to X-Forwarded-For. The
+    # per-IP throttles key on request.remote_addr, which without this is the
+    # proxy's address for every client; set it to the number of proxies
+    # (MEMORIEO_PROXY_FIX_X_FOR=1 behind one nginx), never more, or clients can
+    # spoof their address. 0 when the app is served directly.
+    app.config['PROXY_FIX_X_FOR'] = 0
+
+    # Key for the indexed password fingerprints (changing it invalidates every stored
+    # fingerprint); None uses SECRET_KEY
+    app.config['PASSWORD_FINGERPRINT_KEY'] = None
+
+    # Compile the templates and load the first catalog pages before serving
+    app.config['WARMUP'] = True
+
+    app.config.from_prefixed_env('MEMORIEO')
+    app.config.update(config or {})
+    if app.config['PASSWORD_FINGERPRINT_KEY'] is None:
+        app.config['PASSWORD_FINGERPRINT_KEY'] = app.config['SECRET_KEY']
+    if app.config['SECRET_KEY'] == DEV_SECRET_KEY and not app.debug:
+        app.logger.warning('Using the development SECRET_KEY; set MEMORIEO_SECRET_KEY')
+    configured = time.perf_counter()
+
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    app.register_blueprint(bp)
+    for group in (seller_stats_cli, images_cli, blobs_cli, db_cli):
+        app.cli.add_command(group)
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    ingest.init_uploads(app)
+    init_background(app)
+    # Each request checks out its own connection, returned automatically at teardown
+    init_db(app)
+    init_metrics(app)
+    init_cache(app)
+    init_fragments(app)
+    passwords.init_passwords(app)
+    initialized = time.perf_counter()
+
+    if app.config['WARMUP']:
+        warmup(app)
+    finished = time.perf_counter()
+
+    app.extensions['startup'] = {
+        'config_ms': round((configured - started) * 1000, 1),
+        'init_ms': round((initialized - configured) * 1000, 1),
+        'warmup_ms': round((finished - initialized) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1),
+    }
+    app.logger.info('App ready in %(total_ms).1f ms (config %(config_ms).1f, init %(init_ms).1f, '
+                    'warmup %(warmup_ms).1f)', app.extensions['startup'])
+    return app
+
+# Compile every template (filling the bytecode cache) and load the cached reads
+# behind the first catalog page, its product cards and /categories. A database
+# that is not reachable yet only skips the cache part. Connections opened here
+# are closed afterwards, so workers forked after create_app() inherit none.
+def warmup(app):
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    try:
+        with app.test_request_context('/buyer_dashboard'):
+            cached_categories()
+            products, _ = cached_product_page('all', '', DEFAULT_SORT, None, DEFAULT_PAGE_SIZE)
+            for product in products:
+                product_card(product)
+    except (mysql.connector.Error, PoolTimeout):
+        app.logger.warning('Skipped cache warmup: database unavailable', exc_info=True)
+    finally:
+        app.extensions['db_pool'].dispose()
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
     
\ No newline at end of file
@@ -0,0 +1,354 @@
+import asyncio, inspect, io, json, sys, time
+
+from flask import current_app, request, session, flash, redirect, url_for, render_template, jsonify
+from werkzeug.exceptions import HTTPException
+
+try:
+    import aiomysql
+except ImportError:  # only needed for the async mode
+    aiomysql = None
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # only needed for the async mode
+    WSGIMiddleware = None
+
+import carts, order_history
+from app import (create_app as create_flask_app, login_required, product_list_tag, product_page_key, SELLER_ORDER_STATUSES,
+                 SELLER_ORDERS_PER_PAGE, seller_order_page_query, finish_seller_order_page,
+                 seller_order_lines_query, group_order_lines)
+from cache import get_cache
+from catalog import product_page_query, finish_page, page_size, decode_cursor, PRODUCT_SORTS, DEFAULT_SORT, DEFAULT_PAGE_SIZE
+from metrics import record_query
+
+# Optional async serving mode, for an ASGI server:
+#
+#   uvicorn --factory asgi:create_app --workers 4
+#
+# The read-heavy pages (ASYNC_VIEWS below) run as coroutines on aiomysql, so a
+# worker keeps serving while their queries wait on MySQL, and independent
+# queries of one page run concurrently. Each one runs inside a normal Flask
+# request context for the same URL, so sessions, flash messages, url_for,
+# templates, the cache and the metrics hooks are the ones the threaded app
+# uses, and the two modes can serve the same users side by side. Every other
+# route is handed to the Flask app unchanged on a pool of ASYNC_WSGI_THREADS
+# threads.
+#
+# The async pool is opened on first use inside the server's event loop, so
+# nothing is connected before the server forks its workers.
+
+
+class AsyncDatabase:
+    def __init__(self, config):
+        self.config = config
+        self._pool = None
+        self._opening = None
+
+    async def pool(self):
+        if self._pool is None:
+            if self._opening is None:
+                self._opening = asyncio.Lock()
+            async with self._opening:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.config['MYSQL_HOST'],
+                        user=self.config['MYSQL_USER'],
+                        password=self.config['MYSQL_PASSWORD'],
+                        db=self.config['MYSQL_DATABASE'],
+                        minsize=0,
+                        maxsize=self.config['ASYNC_DB_POOL_SIZE'],
+                        pool_recycle=self.config['DB_POOL_RECYCLE'],
+                        autocommit=True,  # every read sees the latest commits
+                    )
+        return self._pool
+
+    # All rows of one statement, as tuples or (dictionary=True) dicts
+    async def fetchall(self, sql, params=(), dictionary=False):
+        pool = await self.pool()
+        start = time.perf_counter()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cursor:
+                await cursor.execute(sql, params)
+                rows = list(await cursor.fetchall())
+        record_query(sql, time.perf_counter() - start, len(rows))
+        return rows
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+def get_async_db():
+    return current_app.extensions['async_db']
+
+
+async def cached_categories():
+    async def load():
+        return await get_async_db().fetchall("SELECT id, name FROM categories")
+    return await get_cache().get_or_set_async('categories', load, tags=('categories',))
+
+
+# ---- views (same URLs, arguments and templates as the ones in app.py) --------
+
+@login_required
+async def buyer_dashboard():
+    if session.get('role') not in ['buyer', 'seller']:
+        flash('You do not have permission to access this page.', 'danger')
+        return redirect(url_for('main.index'))
+
+    category_id = request.args.get('category_id', 'all')
+    search_query = request.args.get('query', '')
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in PRODUCT_SORTS:
+        sort = DEFAULT_SORT
+    after = request.args.get('after')
+    per_page = page_size(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+
+    async def load_page():
+        sql, params, sort_column = product_page_query(category_id, search_query, sort, after, per_page)
+        rows = await get_async_db().fetchall(sql, params, dictionary=True)
+        return finish_page(rows, sort_column, per_page)
+
+    cache_key = product_page_key(category_id, search_query, sort, after, per_page)
+    categories, (products_dicts, next_cursor) = await asyncio.gather(
+        cached_categories(),
+        get_cache().get_or_set_async(cache_key, load_page, tags=(product_list_tag(category_id),)),
+    )
+
+    return render_template(
+        'buyer_dashboard.html',
+        products=products_dicts,
+        categories=categories,
+        selected_category=category_id,
+        search_query=search_query,
+        sort=sort,
+        sorts=PRODUCT_SORTS,
+        per_page=per_page,
+        is_first_page=not after,
+        next_cursor=next_cursor
+    )
+
+
+@login_required
+async def cart():
+    cart_items = await get_async_db().fetchall(*carts.cart_page_query(session['user_id']), dictionary=True)
+    total_price = sum(item['price'] * item['quantity'] for item in cart_items)
+    return render_template('cart.html', cart_items=cart_items, total_price=total_price)
+
+
+@login_required
+async def checkout():
+    user_id = session['user_id']
+    if request.method == 'POST':
+        selected_items = json.loads(request.form.get('selected_items', '[]'))
+        if not selected_items:
+            return redirect(url_for('main.cart'))
+        lines_query = carts.checkout_lines_query(user_id, selected_items)
+    else:
+        lines_query = carts.checkout_lines_query(user_id)
+
+    db = get_async_db()
+    cart_items, addresses = await asyncio.gather(
+        db.fetchall(*lines_query, dictionary=True),
+        db.fetchall("SELECT id, address FROM addresses WHERE user_id = %s", (user_id,), dictionary=True),
+    )
+    if not cart_items:
+        flash('No items selected for checkout', 'warning')
+        return redirect(url_for('main.cart'))
+
+    total_price = sum(item['total'] for item in cart_items)
+    snapshot = carts.create_snapshot(user_id, cart_items)
+    return render_template('checkout.html',
+                           cart_items=cart_items,
+                           addresses=addresses,
+                           total_price=total_price,
+                           snapshot=snapshot)
+
+
+async def orders_dashboard():
+    user_id = session.get('user_id')
+    if not user_id:
+        flash('Please log in first.', 'login-warning')
+        return redirect(url_for('main.login'))
+
+    status = request.args.get('status', 'Pending')
+    if status not in order_history.ORDER_STATUSES:
+        status = 'Pending'
+    after = request.args.get('after')
+    db = get_async_db()
+
+    async def load_orders():
+        rows = await db.fetchall(*order_history.orders_page_query(user_id, status, after), dictionary=True)
+        orders, next_cursor = order_history.finish_orders_page(rows)
+        if orders:
+            lines_query = order_history.order_lines_query([order['order_id'] for order in orders])
+            order_history.attach_lines(orders, await db.fetchall(*lines_query, dictionary=True))
+        return orders, next_cursor
+
+    async def load_counts():
+        return order_history.counts_from_rows(await db.fetchall(order_history.COUNTS_SQL, (user_id,)))
+
+    (orders, next_cursor), counts = await asyncio.gather(
+        load_orders(),
+        get_cache().get_or_set_async(f'orders:counts:{user_id}', load_counts,
+                                     tags=(order_history.orders_tag(user_id),)),
+    )
+    return render_template('orders_dashboard.html',
+                           orders=orders,
+                           status=status,
+                           statuses=order_history.ORDER_STATUSES,
+                           counts=counts,
+                           next_cursor=next_cursor,
+                           is_first_page=not after)
+
+
+@login_required
+async def seller_orders():
+    seller_id = session['user_id']
+    status = request.args.get('status', 'all')
+    if status not in SELLER_ORDER_STATUSES:
+        status = 'all'
+    after = decode_cursor(request.args.get('after'), str)
+    per_page = SELLER_ORDERS_PER_PAGE
+    db = get_async_db()
+
+    rows = await db.fetchall(*seller_order_page_query(seller_id, status, after, per_page))
+    page, next_cursor = finish_seller_order_page(rows, per_page)
+    orders = []
+    if page:
+        lines = await db.fetchall(*seller_order_lines_query([row[0] for row in page], seller_id, status),
+                                  dictionary=True)
+        orders = list(group_order_lines(lines))
+
+    return render_template('seller_orders.html', orders=orders, status=status,
+                           statuses=SELLER_ORDER_STATUSES, next_cursor=next_cursor,
+                           is_first_page=not after)
+
+
+async def get_categories():
+    categories = await cached_categories()
+    return jsonify([{'id': category[0], 'name': category[1]} for category in categories])
+
+
+# Flask endpoint -> async view
+ASYNC_VIEWS = {
+    'main.buyer_dashboard': buyer_dashboard,
+    'main.cart': cart,
+    'main.checkout': checkout,
+    'main.orders_dashboard': orders_dashboard,
+    'main.seller_orders': seller_orders,
+    'main.get_categories': get_categories,
+}
+
+
+# ---- ASGI glue ----------------------------------------------------------------
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,  # the whole body is buffered
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ', ') + value
+        environ[key] = value
+    return environ
+
+
+async def read_body(receive, limit):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        # Past the limit Flask answers 413 from Content-Length; stop buffering
+        if not message.get('more_body') or (limit and len(body) > limit):
+            return bytes(body)
+
+
+class AsyncApp:
+    def __init__(self, flask_app):
+        if aiomysql is None or WSGIMiddleware is None:
+            raise RuntimeError("The async mode needs the 'aiomysql' and 'a2wsgi' packages")
+        flask_app.config.setdefault('ASYNC_DB_POOL_SIZE', 20)
+        flask_app.config.setdefault('ASYNC_WSGI_THREADS', 10)
+        self.flask_app = flask_app
+        self.db = flask_app.extensions['async_db'] = AsyncDatabase(flask_app.config)
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASYNC_WSGI_THREADS'])
+
+    def async_view(self, scope):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind('localhost').match(scope['path'], method=scope['method'])
+        except HTTPException:  # 404, 405 and redirects are the Flask app's to answer
+            return None
+        return ASYNC_VIEWS.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        view = self.async_view(scope) if scope['type'] == 'http' else None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        flask_app = self.flask_app
+        body = await read_body(receive, flask_app.config.get('MAX_CONTENT_LENGTH'))
+        # The same steps as Flask.full_dispatch_request, with the view awaited
+        with flask_app.request_context(build_environ(scope, body)):
+            try:
+                try:
+                    rv = flask_app.preprocess_request()
+                    if rv is None:
+                        rv = view(**request.view_args)
+                        if inspect.isawaitable(rv):
+                            rv = await rv
+                except Exception as e:
+                    rv = flask_app.handle_user_exception(e)
+                response = flask_app.finalize_request(rv)
+            except Exception as e:
+                response = flask_app.handle_exception(e)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.db.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# ASGI entry point: a new Flask app from app.create_app(config) wrapped for async serving
+def create_app(config=None):
+    return AsyncApp(create_flask_app(config))
@@ -0,0 +1,113 @@
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+# Bounded pool for follow-up work that should not hold up a request (decoding
+# and resizing uploads, for now). At most BACKGROUND_WORKERS tasks run and
+# BACKGROUND_QUEUE_SIZE more wait; when that is full the task runs on the
+# calling thread instead, so a burst slows its own requests down rather than
+# piling up unbounded work. Queued tasks run inside their own app context, so
+# get_db() and get_cache() work and the connection is returned to the pool
+# afterwards. Inline tasks reuse the caller's context and its g.db, so a full
+# queue never takes a second pooled connection for a request that holds one.
+# The threads start on first use, and again in a forked child.
+
+
+class WorkerPool:
+    def __init__(self, app, workers=2, queue_size=32):
+        self.app = app
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._inline = 0
+        self._completed = 0
+        self._failed = 0
+        self._finished = 0  # queued tasks that have run
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='background')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, args, kwargs, inline=False):
+        try:
+            if inline and has_app_context() and current_app._get_current_object() is self.app:
+                fn(*args, **kwargs)
+            else:
+                with self.app.app_context():
+                    fn(*args, **kwargs)
+        except Exception:
+            self.app.logger.exception('Background task %s failed', getattr(fn, '__name__', fn))
+            with self._lock:
+                self._failed += 1
+        else:
+            with self._lock:
+                self._completed += 1
+
+    def _run_queued(self, fn, args, kwargs):
+        try:
+            self._run(fn, args, kwargs)
+        finally:
+            with self._lock:
+                self._finished += 1
+            self._slots.release()
+
+    # Returns True when queued, False when it ran inline because the queue was full
+    def submit(self, fn, *args, **kwargs):
+        executor = self._pool()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._inline += 1
+            self._run(fn, args, kwargs, inline=True)
+            return False
+        with self._lock:
+            self._submitted += 1
+        try:
+            executor.submit(self._run_queued, fn, args, kwargs)
+        except RuntimeError:  # shut down: finish the work here
+            with self._lock:
+                self._submitted -= 1
+                self._inline += 1
+            self._slots.release()
+            self._run(fn, args, kwargs, inline=True)
+            return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'submitted': self._submitted,
+                'inline': self._inline,
+                'completed': self._completed,
+                'failed': self._failed,
+                'pending': self._submitted - self._finished,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+
+def init_background(app):
+    pool = WorkerPool(
+        app,
+        workers=app.config.get('BACKGROUND_WORKERS', 2),
+        queue_size=app.config.get('BACKGROUND_QUEUE_SIZE', 32),
+    )
+    app.extensions['background'] = pool
+    return pool
+
+
+def submit(fn, *args, **kwargs):
+    return current_app.extensions['background'].submit(fn, *args, **kwargs)
@@ -0,0 +1,246 @@
+# Threaded vs async serving benchmark. Starts one server process per mode on
+# the seeded route_bench database and holds N keep-alive connections open
+# against the pages asgi.py serves asynchronously, reporting throughput and
+# latency per mode and connection count as JSON.
+#
+#   python bench/route_bench.py --scale 10k --reseed     # seed ecommerce_bench once
+#   python bench/async_bench.py --connections 10 100 500 --duration 20
+#
+# threaded: the Flask app under gunicorn's gthread worker (--threads), or the
+#           werkzeug threaded server when gunicorn is not installed
+# async:    asgi.AsyncApp around the same app under uvicorn (needs aiomysql, a2wsgi, uvicorn)
+#
+# Both modes run a single worker process, so the numbers compare what one
+# worker sustains. Pages whose data is cached (buyer_dashboard, categories)
+# mostly measure rendering once warm; cart, checkout, orders_dashboard and
+# seller_orders query MySQL on every request.
+import argparse, asyncio, datetime, json, os, platform, random, socket, subprocess, sys, time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import route_bench
+
+# path -> role of the user requesting it
+PAGES = {
+    '/buyer_dashboard': 'buyer',
+    '/cart': 'cart_buyers',
+    '/checkout': 'cart_buyers',
+    '/orders_dashboard': 'buyer',
+    '/seller_orders': 'seller',
+    '/categories': 'buyer',
+}
+MODES = ('threaded', 'async')
+
+
+# ---- server side (run as a child process) ---------------------------------------
+
+def serve(mode, host, port, database, threads):
+    app = route_bench.app
+    app.config['MYSQL_DATABASE'] = database
+    app.extensions['db_pool'].connect_args['database'] = database
+    pool = app.extensions['db_pool']
+    pool.size = max(pool.size, threads)
+
+    if mode == 'async':
+        import uvicorn
+        from asgi import AsyncApp
+        uvicorn.run(AsyncApp(app), host=host, port=port, log_level='warning', access_log=False)
+        return
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        from werkzeug.serving import make_server
+        make_server(host, port, app, threaded=True).serve_forever()
+        return
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {'bind': f'{host}:{port}', 'workers': 1, 'worker_class': 'gthread',
+                               'threads': threads, 'loglevel': 'warning', 'keepalive': 75}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def start_server(mode, port, database, threads):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port),
+                                '--database', database, '--threads', str(threads)], cwd=ROOT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start listening on port {port}')
+
+
+# ---- client side ----------------------------------------------------------------
+
+def session_cookies(ids, count, rng):
+    app = route_bench.app
+    serializer = app.session_interface.get_signing_serializer(app)
+    name = app.config['SESSION_COOKIE_NAME']
+    cookies = {}
+    for role in set(PAGES.values()):
+        users = ids[role] or ids['buyer']
+        session_role = 'seller' if role == 'seller' else 'buyer'
+        cookies[role] = [f'{name}={serializer.dumps({"user_id": user, "role": session_role, "name": "bench"})}'
+                         for user in rng.sample(users, min(count, len(users)))]
+    return cookies
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length, chunked, close = None, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection' and value == 'close':
+            close = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def connection(port, pages, cookies, rng, stop_at, samples):
+    reader = writer = None
+    while time.monotonic() < stop_at:
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        path = rng.choice(pages)
+        request = (f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {rng.choice(cookies[PAGES[path]])}\r\n'
+                   f'Connection: keep-alive\r\n\r\n').encode()
+        started = time.perf_counter()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, close = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            samples.append((time.perf_counter() - started, False))
+            writer.close()
+            writer = None
+            continue
+        samples.append((time.perf_counter() - started, status == 200))
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, pages, cookies, connections, seconds, seed, samples):
+    stop_at = time.monotonic() + seconds
+    await asyncio.gather(*[connection(port, pages, cookies, random.Random(seed + i), stop_at, samples)
+                           for i in range(connections)])
+
+
+async def run_load(port, pages, cookies, connections, duration, warmup, seed):
+    await load(port, pages, cookies, connections, warmup, seed, [])
+    samples = []
+    started = time.perf_counter()
+    await load(port, pages, cookies, connections, duration, seed, samples)
+    wall = time.perf_counter() - started
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample[1]),
+        'throughput_rps': round(len(samples) / wall, 2) if wall else 0.0,
+        'p50_ms': round(route_bench.percentile(latencies, 0.50), 3),
+        'p95_ms': round(route_bench.percentile(latencies, 0.95), 3),
+        'p99_ms': round(route_bench.percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default=os.environ.get('MYSQL_DATABASE', 'ecommerce_bench'))
+    parser.add_argument('--modes', nargs='*', choices=MODES, default=list(MODES))
+    parser.add_argument('--pages', nargs='*', choices=PAGES, default=list(PAGES))
+    parser.add_argument('--connections', nargs='*', type=int, default=[10, 100, 500])
+    parser.add_argument('--duration', type=float, default=15, help='timed seconds per run')
+    parser.add_argument('--warmup', type=float, default=3, help='untimed seconds before each run')
+    parser.add_argument('--threads', type=int, default=10, help='threads of the threaded server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help="JSON results file ('-' for stdout)")
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, '127.0.0.1', args.port, args.database, args.threads)
+        return
+
+    if not route_bench.database_exists(args.database):
+        sys.exit(f'{args.database} is not seeded; run bench/route_bench.py --reseed first')
+    rng = random.Random(args.seed)
+    cookies = session_cookies(route_bench.load_ids(args.database), 200, rng)
+
+    results = {
+        'revision': route_bench.git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': args.database,
+        'pages': args.pages,
+        'threads': args.threads,
+        'duration': args.duration,
+        'modes': {},
+    }
+    for mode in args.modes:
+        server = start_server(mode, args.port, args.database, args.threads)
+        try:
+            results['modes'][mode] = {
+                str(n): asyncio.run(run_load(args.port, args.pages, cookies, n, args.duration, args.warmup, args.seed))
+                for n in args.connections
+            }
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(f"{'connections':<13}" + ''.join(f"{mode + ' req/s':>16}{mode + ' p95':>14}" for mode in results['modes']),
+          file=sys.stderr)
+    for n in args.connections:
+        line = f'{n:<13}'
+        for runs in results['modes'].values():
+            r = runs[str(n)]
+            line += f"{r['throughput_rps']:>16.1f}{r['p95_ms']:>14.2f}"
+        print(line, file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
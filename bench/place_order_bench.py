@@ -0,0 +1,112 @@
+# place_order throughput benchmark: fills a cart with N lines and times
+# POST /place_order through the real route, for several cart sizes.
+#
+#   MYSQL_DATABASE=ecommerce_bench python bench/place_order_bench.py --orders 200 1 5 20 50
+#
+# Run it against a scratch copy of the schema (memorieo_DB + migrations/), never
+# against the live database. Everything it creates is removed at the end.
+import argparse, os, sys, time, statistics, uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app
+from database import get_db
+import carts
+
+app = create_app({'WARMUP': False})
+
+PRODUCTS = 100
+
+
+def setup(tag):
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO users (name, email, password, role) VALUES (%s, %s, 'x', 'seller')",
+                       (f'{tag}-seller', f'{tag}-seller@example.com'))
+        seller_id = cursor.lastrowid
+        cursor.execute("INSERT INTO users (name, email, password, role) VALUES (%s, %s, 'x', 'buyer')",
+                       (f'{tag}-buyer', f'{tag}-buyer@example.com'))
+        buyer_id = cursor.lastrowid
+        cursor.execute("INSERT INTO addresses (user_id, name, address) VALUES (%s, 'bench', 'bench')", (buyer_id,))
+        address_id = cursor.lastrowid
+        rows = [(seller_id, f'{tag} product {i}', '8x8', 20, 1000000, 100 + i) for i in range(PRODUCTS)]
+        cursor.execute(
+            "INSERT INTO products (user_id, product_name, size, pages, stock, price) VALUES "
+            + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows)),
+            [value for row in rows for value in row]
+        )
+        cursor.execute("SELECT id, price FROM products WHERE user_id = %s ORDER BY id", (seller_id,))
+        prices = dict(cursor.fetchall())
+        db.commit()
+    return seller_id, buyer_id, address_id, prices
+
+
+# Refill the cart outside the timed section and return the checkout snapshot
+# the form would post for it
+def fill_cart(buyer_id, prices, lines):
+    product_ids = list(prices)[:lines]
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (buyer_id,))
+        cursor.execute(
+            "INSERT INTO cart_items (user_id, product_id, quantity) VALUES "
+            + ', '.join(['(%s, %s, 1)'] * len(product_ids)),
+            [value for product_id in product_ids for value in (buyer_id, product_id)]
+        )
+        db.commit()
+        return carts.create_snapshot(buyer_id, [
+            {'product_id': product_id, 'quantity': 1, 'price': prices[product_id]} for product_id in product_ids
+        ])
+
+
+def teardown(seller_id, buyer_id):
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("DELETE oi FROM order_items oi JOIN orders o ON oi.order_id = o.id WHERE o.user_id = %s", (buyer_id,))
+        cursor.execute("DELETE FROM orders WHERE user_id = %s", (buyer_id,))
+        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (buyer_id,))
+        cursor.execute("DELETE FROM addresses WHERE user_id = %s", (buyer_id,))
+        cursor.execute("DELETE FROM products WHERE user_id = %s", (seller_id,))
+        cursor.execute("DELETE FROM seller_stats WHERE seller_id = %s", (seller_id,))
+        cursor.execute("DELETE FROM users WHERE id IN (%s, %s)", (seller_id, buyer_id))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100, help='orders per cart size')
+    parser.add_argument('sizes', type=int, nargs='*', default=[1, 5, 20, 50])
+    args = parser.parse_args()
+
+    app.extensions['db_pool'].connect_args['database'] = os.environ.get('MYSQL_DATABASE', 'ecommerce_bench')
+    tag = f'bench-order-{uuid.uuid4().hex[:8]}'
+    seller_id, buyer_id, address_id, prices = setup(tag)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = buyer_id
+        sess['role'] = 'buyer'
+
+    try:
+        for size in args.sizes:
+            timings = []
+            for _ in range(args.orders):
+                snapshot = fill_cart(buyer_id, prices, min(size, PRODUCTS))
+                start = time.perf_counter()
+                response = client.post('/place_order', data={'address_id': address_id,
+                                                             'payment_method': 'Cash On Delivery',
+                                                             'snapshot': snapshot})
+                timings.append(time.perf_counter() - start)
+                location = response.headers.get('Location', '')
+                if not location.endswith('/orders_dashboard'):
+                    raise SystemExit(f'place_order failed for {size} lines: {response.status_code} -> {location}')
+            print(f"cart_lines={size:>3}  orders/sec={len(timings) / sum(timings):8.1f}  "
+                  f"p50={statistics.median(timings) * 1000:7.2f}ms  max={max(timings) * 1000:7.2f}ms")
+    finally:
+        teardown(seller_id, buyer_id)
+
+
+if __name__ == '__main__':
+    main()
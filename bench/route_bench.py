@@ -0,0 +1,439 @@
+# Route benchmark suite. Builds a scratch database from memorieo_DB plus
+# migrations/, seeds it with a synthetic dataset of the chosen scale, then drives
+# the real Flask routes through the test client and reports p50/p95/p99
+# latency, throughput and SQL statements per request (from the Server-Timing
+# header written by metrics.py) as JSON that can be compared across commits.
+#
+#   python bench/route_bench.py --scale 10k --reseed                  # build and seed ecommerce_bench
+#   python bench/route_bench.py --requests 500 --output results.json  # reuse the seeded data
+#   python bench/route_bench.py --scenarios buyer_search cart --baseline results.json
+#
+# Scales: 1k, 10k, 100k, 1m buyers and products (orders and order lines scale
+# with them). --reseed drops the database named by --database / MYSQL_DATABASE
+# (default ecommerce_bench) first: never point it at a live database.
+import argparse, datetime, json, os, platform, random, re, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import mysql.connector
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from cache import get_cache
+from database import get_db
+import carts
+import migrations
+import seller_stats
+
+app = create_app({'WARMUP': False})
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+BATCH = 5000
+TABLES = ('users', 'categories', 'products', 'addresses', 'cart_items', 'orders', 'order_items', 'seller_requests')
+
+WORDS = ('Family', 'Wedding', 'Travel', 'Friends', 'Memories', 'Album', 'Story', 'Love', 'Adventure',
+         'Forever', 'Journey', 'Moments', 'Holiday', 'Summer', 'Baby', 'Graduation', 'Birthday', 'Classic')
+SIZES = ('8x8', '7x7', '9x4', '5x6', '8x9')
+ORDER_STATUSES = ('Pending', 'Pending', 'Shipped', 'Delivered', 'Delivered', 'Cancelled')
+CART_LINES = 3
+ORDER_LINES = 2
+
+
+def volumes_for(scale):
+    n = SCALES[scale]
+    return {
+        'buyers': n,
+        'sellers': max(2, n // 100),
+        'categories': min(50, max(4, n // 1000)),
+        'products': n,
+        'cart_buyers': max(10, n // 10),
+        'orders': n,
+        'seller_requests': max(10, n // 100),
+    }
+
+
+# ---- schema -------------------------------------------------------------------
+
+# memorieo_DB's table definitions; its data, CREATE DATABASE and USE are skipped
+def schema_statements():
+    with open(os.path.join(ROOT, 'memorieo_DB'), encoding='utf-8') as f:
+        return [
+            s for s in migrations.split_statements(f.read())
+            if not re.match(r'(?is)^(/\*.*?\*/\s*)*(insert|create database|use)\b', s)
+        ]
+
+
+def server_args():
+    args = dict(app.extensions['db_pool'].connect_args)
+    args.pop('database', None)
+    return args
+
+
+def create_schema(database):
+    conn = mysql.connector.connect(**server_args())
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}` DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci")
+    cursor.execute(f"USE `{database}`")
+    for statement in schema_statements():
+        cursor.execute(statement)
+    conn.commit()
+    migrations.migrate(conn)
+    conn.close()
+
+
+def database_exists(database):
+    conn = mysql.connector.connect(**server_args())
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s AND table_name = 'users'",
+                   (database,))
+    exists = cursor.fetchone()[0] > 0
+    conn.close()
+    return exists
+
+
+# ---- seeding ------------------------------------------------------------------
+
+def insert_rows(cursor, table, columns, rows):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany(sql, rows[start:start + BATCH])
+
+
+def seed(database, volumes, rng):
+    conn = mysql.connector.connect(database=database, **server_args())
+    cursor = conn.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0, UNIQUE_CHECKS = 0")
+    now = datetime.datetime.now().replace(microsecond=0)
+    password = generate_password_hash('bench-password', method='pbkdf2:sha256')
+
+    def some_time():
+        return now - datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+    # users: 1 is the admin, then sellers, then buyers
+    sellers = list(range(2, volumes['sellers'] + 2))
+    buyers = list(range(sellers[-1] + 1, sellers[-1] + 1 + volumes['buyers']))
+    users = [(1, 'Bench Admin', 'admin@bench.test', password, 'admin', 'active', some_time())]
+    users += [(i, f'Seller {i}', f'seller{i}@bench.test', password, 'seller', 'active', some_time()) for i in sellers]
+    users += [(i, f'Buyer {i}', f'buyer{i}@bench.test', password, 'buyer',
+               'archived' if rng.random() < 0.02 else 'active', some_time()) for i in buyers]
+    insert_rows(cursor, 'users', ('id', 'name', 'email', 'password', 'role', 'status', 'created_at'), users)
+    del users
+
+    categories = list(range(1, volumes['categories'] + 1))
+    insert_rows(cursor, 'categories', ('id', 'name'), [(i, f'{WORDS[i % len(WORDS)]} {i}') for i in categories])
+
+    prices = {}
+    products = []
+    for i in range(1, volumes['products'] + 1):
+        prices[i] = rng.randrange(100, 1000)
+        name = ' '.join(rng.sample(WORDS, 3)) + f' {i}'
+        products.append((i, sellers[i % len(sellers)], categories[i % len(categories)], name, rng.choice(SIZES),
+                         rng.randrange(10, 100), 1000000, prices[i], int(rng.random() < 0.05), some_time()))
+    insert_rows(cursor, 'products', ('id', 'user_id', 'category_id', 'product_name', 'size', 'pages', 'stock',
+                                     'price', 'is_archive', 'created_at'), products)
+    del products
+
+    insert_rows(cursor, 'addresses', ('id', 'user_id', 'name', 'address', 'phone'),
+                [(buyer, buyer, f'Buyer {buyer}', f'{buyer} Bench Street', '0900000000') for buyer in buyers])
+
+    product_ids = list(prices)
+    cart = []
+    for buyer in buyers[:volumes['cart_buyers']]:
+        cart.extend((buyer, product_id, rng.randrange(1, 4)) for product_id in rng.sample(product_ids, CART_LINES))
+    insert_rows(cursor, 'cart_items', ('user_id', 'product_id', 'quantity'), cart)
+    del cart
+
+    orders, lines = [], []
+    for order_id in range(1, volumes['orders'] + 1):
+        buyer = rng.choice(buyers)
+        status = rng.choice(ORDER_STATUSES)
+        line_status = 'Pending' if status == 'Cancelled' else status
+        total = 0
+        for product_id in rng.sample(product_ids, ORDER_LINES):
+            quantity = rng.randrange(1, 4)
+            total += quantity * prices[product_id]
+            lines.append((order_id, product_id, quantity, prices[product_id], line_status))
+        orders.append((order_id, buyer, buyer, 'Cash On Delivery', status, total, some_time()))
+        if len(lines) >= BATCH * 4:
+            insert_rows(cursor, 'orders', ('id', 'user_id', 'address_id', 'payment_method', 'status',
+                                           'total_amount', 'created_at'), orders)
+            insert_rows(cursor, 'order_items', ('order_id', 'product_id', 'quantity', 'price', 'seller_status'), lines)
+            orders, lines = [], []
+    insert_rows(cursor, 'orders', ('id', 'user_id', 'address_id', 'payment_method', 'status',
+                                   'total_amount', 'created_at'), orders)
+    insert_rows(cursor, 'order_items', ('order_id', 'product_id', 'quantity', 'price', 'seller_status'), lines)
+
+    insert_rows(cursor, 'seller_requests', ('user_id', 'business_name', 'email', 'profile_description', 'status'),
+                [(buyer, f'Studio {buyer}', f'buyer{buyer}@bench.test', 'Photobooks for every occasion.',
+                  rng.choice(('pending', 'approved', 'rejected')))
+                 for buyer in rng.sample(buyers, min(len(buyers), volumes['seller_requests']))])
+
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1, UNIQUE_CHECKS = 1")
+    conn.commit()
+    conn.close()
+
+    with app.app_context():
+        db = get_db()
+        seller_stats.rebuild(db)
+        db.commit()
+
+
+def table_counts(database):
+    conn = mysql.connector.connect(database=database, **server_args())
+    cursor = conn.cursor()
+    counts = {}
+    for table in TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cursor.fetchone()[0]
+    conn.close()
+    return counts
+
+
+def load_ids(database):
+    conn = mysql.connector.connect(database=database, **server_args())
+    cursor = conn.cursor()
+    ids = {}
+    for role in ('admin', 'seller', 'buyer'):
+        cursor.execute("SELECT id FROM users WHERE role = %s AND status = 'active' ORDER BY id LIMIT 10000", (role,))
+        ids[role] = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT user_id FROM cart_items ORDER BY user_id LIMIT 10000")
+    ids['cart_buyers'] = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id, price FROM products WHERE is_archive = 0 ORDER BY id LIMIT 10000")
+    ids['prices'] = dict(cursor.fetchall())
+    ids['products'] = list(ids['prices'])
+    conn.close()
+    return ids
+
+
+# ---- scenarios ----------------------------------------------------------------
+
+class Context:
+    def __init__(self, database, ids, rng):
+        self.database = database
+        self.ids = ids
+        self.rng = rng
+        self.conn = None
+
+    # Refill a buyer's cart outside the timed section (place_order empties it) and
+    # return the checkout snapshot the form would post for it
+    def fill_cart(self, buyer):
+        if self.conn is None:
+            self.conn = mysql.connector.connect(database=self.database, **server_args())
+        products = self.rng.sample(self.ids['products'], CART_LINES)
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (buyer,))
+        cursor.executemany("INSERT INTO cart_items (user_id, product_id, quantity) VALUES (%s, %s, 1)",
+                           [(buyer, p) for p in products])
+        self.conn.commit()
+        with app.app_context():
+            return carts.create_snapshot(buyer, [
+                {'product_id': p, 'quantity': 1, 'price': self.ids['prices'][p]} for p in products
+            ])
+
+
+# name -> function(ctx, worker, i) returning (role, user_id, method, path, data)
+def buyer_dashboard(ctx, worker, i):
+    return 'buyer', ctx.rng.choice(ctx.ids['buyer']), 'GET', '/buyer_dashboard', None
+
+
+def buyer_search(ctx, worker, i):
+    query = ' '.join(ctx.rng.sample(WORDS, ctx.rng.choice((1, 2))))
+    return 'buyer', ctx.rng.choice(ctx.ids['buyer']), 'GET', f'/buyer_dashboard?query={query}', None
+
+
+def seller_dashboard(ctx, worker, i):
+    return 'seller', ctx.rng.choice(ctx.ids['seller']), 'GET', '/seller_dashboard', None
+
+
+def seller_orders(ctx, worker, i):
+    return 'seller', ctx.rng.choice(ctx.ids['seller']), 'GET', '/seller_orders', None
+
+
+def cart(ctx, worker, i):
+    return 'buyer', ctx.rng.choice(ctx.ids['cart_buyers']), 'GET', '/cart', None
+
+
+def checkout(ctx, worker, i):
+    return 'buyer', ctx.rng.choice(ctx.ids['cart_buyers']), 'GET', '/checkout', None
+
+
+# Workers use disjoint buyers so concurrent checkouts never share a cart
+def place_order(ctx, worker, i, workers=1):
+    buyers = ctx.ids['cart_buyers']
+    buyer = buyers[(i * workers + worker) % len(buyers)]
+    snapshot = ctx.fill_cart(buyer)
+    return 'buyer', buyer, 'POST', '/place_order', {'address_id': buyer, 'payment_method': 'Cash On Delivery',
+                                                    'snapshot': snapshot}
+
+
+def admin_dashboard(ctx, worker, i):
+    return 'admin', ctx.ids['admin'][0], 'GET', '/admin/dashboard', None
+
+
+SCENARIOS = {
+    'buyer_dashboard': buyer_dashboard,
+    'buyer_search': buyer_search,
+    'seller_dashboard': seller_dashboard,
+    'seller_orders': seller_orders,
+    'cart': cart,
+    'checkout': checkout,
+    'place_order': place_order,
+    'admin_dashboard': admin_dashboard,
+}
+
+SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def run_request(client, ctx, scenario, worker, i, workers, cold_cache):
+    if scenario is place_order:
+        role, user_id, method, path, data = scenario(ctx, worker, i, workers)
+    else:
+        role, user_id, method, path, data = scenario(ctx, worker, i)
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['role'] = role
+        sess['name'] = f'bench {user_id}'
+    if cold_cache:
+        with app.app_context():
+            get_cache().clear()
+
+    start = time.perf_counter()
+    response = client.open(path, method=method, data=data)
+    response.get_data()
+    elapsed = time.perf_counter() - start
+
+    ok = response.status_code < 400
+    if scenario is place_order:
+        ok = response.headers.get('Location', '').endswith('/orders_dashboard')
+    timing = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+    response.close()
+    return elapsed, ok, int(timing.group(2)) if timing else 0, float(timing.group(1)) if timing else 0.0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(name, ctx_factory, requests, warmup, concurrency, cold_cache):
+    scenario = SCENARIOS[name]
+
+    def worker(index):
+        client = app.test_client()
+        ctx = ctx_factory(index)
+        for i in range(warmup):
+            run_request(client, ctx, scenario, index, -1 - i, concurrency, cold_cache)
+        samples = [run_request(client, ctx, scenario, index, i, concurrency, cold_cache)
+                   for i in range(index, requests, concurrency)]
+        if ctx.conn is not None:
+            ctx.conn.close()
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = [sample for batch in executor.map(worker, range(concurrency)) for sample in batch]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample[1]),
+        'throughput_rps': round(len(samples) / wall, 2) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'queries_per_request': round(sum(sample[2] for sample in samples) / len(samples), 2) if samples else 0.0,
+        'db_ms_per_request': round(sum(sample[3] for sample in samples) / len(samples), 3) if samples else 0.0,
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(results, baseline=None):
+    print(f"{'scenario':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}",
+          file=sys.stderr)
+    for name, r in results['scenarios'].items():
+        line = (f"{name:<18}{r['throughput_rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['p99_ms']:>10.2f}{r['queries_per_request']:>9.1f}{r['errors']:>8}")
+        before = (baseline or {}).get('scenarios', {}).get(name)
+        if before and before['p95_ms']:
+            change = (r['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            line += f"   p95 {change:+.1f}% vs {baseline.get('revision') or 'baseline'}"
+        print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default=os.environ.get('MYSQL_DATABASE', 'ecommerce_bench'))
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--reseed', action='store_true', help='drop, recreate and seed the database')
+    parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per worker first')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--cold-cache', action='store_true', help='clear the app cache before every request')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help="JSON results file ('-' for stdout)")
+    parser.add_argument('--baseline', help='earlier JSON results to compare p95 against')
+    args = parser.parse_args()
+
+    pool = app.extensions['db_pool']
+    pool.connect_args['database'] = args.database
+    pool.size = max(pool.size, args.concurrency)
+
+    rng = random.Random(args.seed)
+    if args.reseed or not database_exists(args.database):
+        started = time.perf_counter()
+        create_schema(args.database)
+        seed(args.database, volumes_for(args.scale), rng)
+        print(f"seeded {args.database} at scale {args.scale} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    ids = load_ids(args.database)
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': args.database,
+        'scale': args.scale,
+        'rows': table_counts(args.database),
+        'concurrency': args.concurrency,
+        'cold_cache': args.cold_cache,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        results['scenarios'][name] = run_scenario(
+            name, lambda index: Context(args.database, ids, random.Random(args.seed + index)),
+            args.requests, args.warmup, args.concurrency, args.cold_cache,
+        )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
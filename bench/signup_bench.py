@@ -0,0 +1,81 @@
+# Signup latency benchmark: seeds the users table up to each target size and
+# times POST /signup through the real route, to show the password reuse check
+# no longer grows with the number of registered users.
+#
+#   MYSQL_DATABASE=ecommerce_bench python bench/signup_bench.py 1000 10000 100000 1000000
+#
+# Run it against a scratch copy of the schema (memorieo_DB + migrations/), never
+# against the live database. Seeded rows are removed at the end.
+import os, sys, time, statistics, uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app, password_fingerprint
+from database import get_db
+
+# Every timed signup comes from 127.0.0.1, so lift the per-IP signup limit
+app = create_app({'WARMUP': False, 'SIGNUP_ATTEMPTS_PER_IP': (1000000, 60)})
+
+SEED_PREFIX = 'bench-signup-'
+BATCH = 5000
+SAMPLES = 20
+
+
+def seed_users(cursor, start, stop):
+    # Real PBKDF2 hashes are irrelevant here: signup only touches the fingerprint index
+    for batch_start in range(start, stop, BATCH):
+        rows = []
+        for i in range(batch_start, min(batch_start + BATCH, stop)):
+            rows.append((f'{SEED_PREFIX}{i}', f'{SEED_PREFIX}{i}@example.com', 'x',
+                         password_fingerprint(f'{SEED_PREFIX}password-{i}')))
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+        cursor.execute(
+            f"INSERT INTO users (name, email, password, password_fingerprint) VALUES {placeholders}",
+            [value for row in rows for value in row]
+        )
+
+
+def time_signups(client):
+    timings = []
+    for _ in range(SAMPLES):
+        token = uuid.uuid4().hex
+        start = time.perf_counter()
+        response = client.post('/signup', data={
+            'name': f'{SEED_PREFIX}new-{token}',
+            'email': f'{SEED_PREFIX}new-{token}@example.com',
+            'password': f'{SEED_PREFIX}new-password-{token}',
+        })
+        timings.append(time.perf_counter() - start)
+        # Failed signups redirect too, so check the flashed outcome
+        with client.session_transaction() as session:
+            categories = [category for category, _ in session.pop('_flashes', [])]
+        if response.status_code != 302 or categories != ['signup-success']:
+            raise SystemExit(f'signup failed: status {response.status_code}, flashes {categories}')
+    return timings
+
+
+def main(sizes):
+    pool_args = app.extensions['db_pool'].connect_args
+    pool_args['database'] = os.environ.get('MYSQL_DATABASE', 'ecommerce_bench')
+    client = app.test_client()
+    seeded = 0
+    try:
+        for size in sorted(sizes):
+            # Seed in its own app context so the timed requests use their own pooled connections
+            with app.app_context():
+                db = get_db()
+                seed_users(db.cursor(), seeded, size)
+                db.commit()
+            seeded = size
+            timings = time_signups(client)
+            print(f"users={size:>9}  signup p50={statistics.median(timings) * 1000:8.1f}ms  "
+                  f"max={max(timings) * 1000:8.1f}ms")
+    finally:
+        with app.app_context():
+            db = get_db()
+            db.cursor().execute("DELETE FROM users WHERE email LIKE %s", (SEED_PREFIX + '%',))
+            db.commit()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000])
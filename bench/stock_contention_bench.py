@@ -0,0 +1,124 @@
+# Stock contention benchmark: many buyers check out the same product at once.
+# Reports throughput and outcomes and checks that stock never oversells.
+#
+#   MYSQL_DATABASE=ecommerce_bench python bench/stock_contention_bench.py --buyers 300 --stock 100 --workers 50
+#
+# Run it against a scratch copy of the schema (memorieo_DB + migrations/), never
+# against the live database. Everything it creates is removed at the end.
+import argparse, os, sys, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app
+from database import get_db
+import carts
+
+app = create_app({'WARMUP': False})
+
+PRICE = 500
+
+
+def setup(tag, buyers, stock):
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO users (name, email, password, role) VALUES (%s, %s, 'x', 'seller')",
+                       (f'{tag}-seller', f'{tag}-seller@example.com'))
+        seller_id = cursor.lastrowid
+        cursor.execute("INSERT INTO products (user_id, product_name, size, pages, stock, price) "
+                       "VALUES (%s, %s, '8x8', 20, %s, %s)", (seller_id, f'{tag} hot product', stock, PRICE))
+        product_id = cursor.lastrowid
+
+        buyer_ids = []
+        for i in range(buyers):
+            cursor.execute("INSERT INTO users (name, email, password) VALUES (%s, %s, 'x')",
+                           (f'{tag}-buyer-{i}', f'{tag}-buyer-{i}@example.com'))
+            buyer_id = cursor.lastrowid
+            cursor.execute("INSERT INTO addresses (user_id, name, address) VALUES (%s, 'bench', 'bench')", (buyer_id,))
+            address_id = cursor.lastrowid
+            cursor.execute("INSERT INTO cart_items (user_id, product_id, quantity) VALUES (%s, %s, 1)",
+                           (buyer_id, product_id))
+            buyer_ids.append((buyer_id, address_id))
+        db.commit()
+
+        # The signed snapshot the checkout form would post for each buyer's cart
+        buyers = [(buyer_id, address_id, carts.create_snapshot(buyer_id, [
+            {'product_id': product_id, 'quantity': 1, 'price': PRICE}
+        ])) for buyer_id, address_id in buyer_ids]
+    return seller_id, product_id, buyers
+
+
+def checkout(buyer):
+    buyer_id, address_id, snapshot = buyer
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = buyer_id
+        sess['role'] = 'buyer'
+    response = client.post('/place_order', data={'address_id': address_id, 'payment_method': 'Cash On Delivery',
+                                                  'snapshot': snapshot})
+    location = response.headers.get('Location', '')
+    if location.endswith('/orders_dashboard'):
+        return 'ordered'
+    if location.endswith('/cart'):
+        return 'out_of_stock'
+    return 'error'
+
+
+def teardown(tag, seller_id, product_id):
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("DELETE FROM order_items WHERE product_id = %s", (product_id,))
+        cursor.execute("DELETE o FROM orders o JOIN users u ON o.user_id = u.id WHERE u.email LIKE %s", (tag + '%',))
+        cursor.execute("DELETE FROM cart_items WHERE product_id = %s", (product_id,))
+        cursor.execute("DELETE a FROM addresses a JOIN users u ON a.user_id = u.id WHERE u.email LIKE %s", (tag + '%',))
+        cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        cursor.execute("DELETE FROM seller_stats WHERE seller_id = %s", (seller_id,))
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (tag + '%',))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=50)
+    args = parser.parse_args()
+
+    pool = app.extensions['db_pool']
+    pool.connect_args['database'] = os.environ.get('MYSQL_DATABASE', 'ecommerce_bench')
+    pool.size = args.workers
+    pool.max_overflow = 0
+
+    tag = f'bench-stock-{uuid.uuid4().hex[:8]}'
+    seller_id, product_id, buyers = setup(tag, args.buyers, args.stock)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            outcomes = list(executor.map(checkout, buyers))
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            cursor = get_db().cursor()
+            cursor.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+            final_stock = cursor.fetchone()[0]
+
+        ordered = outcomes.count('ordered')
+        print(f"buyers={args.buyers} workers={args.workers} stock={args.stock}")
+        print(f"checkouts/sec={len(outcomes) / elapsed:.1f}  elapsed={elapsed:.2f}s")
+        print(f"ordered={ordered}  out_of_stock={outcomes.count('out_of_stock')}  errors={outcomes.count('error')}")
+        print(f"final stock={final_stock}  oversold={'yes' if final_stock < 0 or ordered > args.stock else 'no'}")
+        if final_stock != args.stock - ordered:
+            print("stock does not match the number of orders placed")
+            raise SystemExit(1)
+        # Every buyer wants one unit, so exactly min(buyers, stock) checkouts must succeed
+        if ordered != min(args.buyers, args.stock):
+            print(f"expected {min(args.buyers, args.stock)} orders, got {ordered}")
+            raise SystemExit(1)
+    finally:
+        teardown(tag, seller_id, product_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Upload caching benchmark: loads /buyer_dashboard repeatedly like a browser
+# would, fetching every product image through a private HTTP cache that honours
+# Cache-Control max-age/immutable and revalidates with If-None-Match. Reports
+# requests, 304s and bytes transferred per page load; after the first load no
+# image body should be transferred again. Also checks a Range request.
+#
+#   MYSQL_DATABASE=ecommerce_bench python bench/upload_cache_bench.py --loads 5
+#
+# Reads the catalog of the given database; it writes nothing.
+import argparse, os, re, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.http import parse_cache_control_header
+
+from app import create_app
+
+app = create_app({'WARMUP': False})
+
+IMAGE_URL = re.compile(r'<img[^>]*\ssrc="(/uploads/[^"]+)"')
+
+
+class BrowserCache:
+    def __init__(self, client):
+        self.client = client
+        self.entries = {}  # url -> (etag, expires_at)
+
+    def fetch(self, url, now):
+        entry = self.entries.get(url)
+        if entry and entry[1] > now:
+            return 'fresh', 0
+        headers = {'If-None-Match': entry[0]} if entry else {}
+        response = self.client.get(url, headers=headers)
+        transferred = len(response.get_data())
+        status = response.status_code
+        cache_control = parse_cache_control_header(response.headers.get('Cache-Control'))
+        max_age = 0 if cache_control.no_cache else (cache_control.max_age or 0)
+        if status in (200, 304) and response.headers.get('ETag'):
+            self.entries[url] = (response.headers['ETag'], now + max_age)
+        response.close()
+        return status, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--loads', type=int, default=5)
+    parser.add_argument('--category', default='all')
+    args = parser.parse_args()
+
+    app.extensions['db_pool'].connect_args['database'] = os.environ.get('MYSQL_DATABASE', 'ecommerce_bench')
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 0
+        sess['role'] = 'buyer'
+    cache = BrowserCache(client)
+
+    repeat_bytes = 0
+    for load in range(1, args.loads + 1):
+        page = client.get('/buyer_dashboard', query_string={'category_id': args.category})
+        html = page.get_data(as_text=True)
+        urls = IMAGE_URL.findall(html)
+        outcomes = [cache.fetch(url.replace('&amp;', '&'), time.time()) for url in urls]
+        image_bytes = sum(size for _, size in outcomes)
+        if load > 1:
+            repeat_bytes += image_bytes
+        print(f"load={load}  page_bytes={len(html.encode())}  images={len(urls)}  "
+              f"fetched={sum(1 for status, _ in outcomes if status == 200)}  "
+              f"not_modified={sum(1 for status, _ in outcomes if status == 304)}  "
+              f"from_cache={sum(1 for status, _ in outcomes if status == 'fresh')}  "
+              f"image_bytes={image_bytes}")
+
+    if urls:
+        path = urls[0].split('?')[0]
+        response = client.get(path, headers={'Range': 'bytes=0-1023'})
+        print(f"range status={response.status_code}  content_range={response.headers.get('Content-Range')}  "
+              f"bytes={len(response.get_data())}")
+        response.close()
+
+    if repeat_bytes:
+        print(f"repeat loads transferred {repeat_bytes} image bytes")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import shutil
+import time
+
+from images import VARIANT_WIDTHS, variant_name
+
+# Content-addressed storage for uploads. A file is stored once under
+#   <UPLOAD_FOLDER>/blobs/<sha[0:2]>/<sha[2:4]>/<sha256>.<ext>
+# and that relative path (the blob key) is what products.image_path and
+# seller_requests.id_proof/product_photo hold. Identical uploads share a blob,
+# names never collide, and the URL changes whenever the content does, so it can
+# be cached as immutable. Rows written before this still hold flat filenames;
+# those keep working and can be moved in with `flask blobs import`.
+#
+# Table blobs (migrations/006) counts the rows referencing each key. Like
+# seller_stats, add_refs runs in the caller's transaction without committing.
+# gc deletes blobs nobody references once they are older than a grace period,
+# which covers uploads whose row has not been committed yet.
+
+BLOB_DIR = 'blobs'
+KEY_PATTERN = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+$')
+KIND_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp', 'pdf': 'pdf'}
+
+# Every column that can reference a blob
+REFERENCES_QUERY = """
+    SELECT image_path AS blob_key FROM products
+    UNION ALL SELECT id_proof FROM seller_requests
+    UNION ALL SELECT product_photo FROM seller_requests
+"""
+
+
+def blob_key(digest, kind):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{KIND_EXTENSIONS[kind]}'
+
+
+# The SHA-256 a key was named after, or None for legacy flat filenames
+def key_digest(key):
+    match = KEY_PATTERN.match(key or '')
+    return match.group(1) if match else None
+
+
+def add_refs(db, *keys):
+    keys = [key for key in keys if key_digest(key)]
+    if not keys:
+        return
+    cursor = db.cursor()
+    cursor.executemany("""
+        INSERT INTO blobs (blob_key, refcount) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE refcount = refcount + 1
+    """, [(key,) for key in keys])
+    cursor.close()
+
+
+# Recount references from the base tables
+def rebuild(db):
+    cursor = db.cursor()
+    cursor.execute(f"""
+        INSERT INTO blobs (blob_key, refcount)
+        SELECT blob_key, COUNT(*) FROM ({REFERENCES_QUERY}) r
+        WHERE blob_key LIKE 'blobs/%'
+        GROUP BY blob_key
+        ON DUPLICATE KEY UPDATE refcount = VALUES(refcount)
+    """)
+    cursor.execute(f"""
+        UPDATE blobs SET refcount = 0
+        WHERE blob_key NOT IN (SELECT blob_key FROM ({REFERENCES_QUERY}) r WHERE blob_key IS NOT NULL)
+    """)
+    cursor.close()
+
+
+def _stored_keys(folder):
+    root = os.path.join(folder, BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for name in files:
+            key = os.path.relpath(os.path.join(directory, name), folder).replace(os.sep, '/')
+            if key_digest(key):
+                yield key
+
+
+def _remove(folder, key):
+    freed = 0
+    for name in [key] + [variant_name(key, width) for width in VARIANT_WIDTHS]:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+    return freed
+
+
+# Delete blobs (and their variants) with no references that are older than
+# grace seconds. Returns [(key, bytes freed)].
+def gc(db, folder, grace, dry_run=False):
+    cutoff = time.time() - grace
+    cursor = db.cursor()
+    removed = []
+    for key in _stored_keys(folder):
+        if os.path.getmtime(os.path.join(folder, key)) > cutoff:
+            continue
+        # Locks the row (or the gap where it would be), so a concurrent upload
+        # cannot add a reference between this check and the delete
+        cursor.execute("SELECT refcount FROM blobs WHERE blob_key = %s FOR UPDATE", (key,))
+        row = cursor.fetchone()
+        # Re-checked under the lock: an upload of the same content touches the file
+        if (row and row[0] > 0) or os.path.getmtime(os.path.join(folder, key)) > cutoff:
+            db.rollback()
+            continue
+        if dry_run:
+            removed.append((key, os.path.getsize(os.path.join(folder, key))))
+            db.rollback()
+            continue
+        removed.append((key, _remove(folder, key)))
+        cursor.execute("DELETE FROM blobs WHERE blob_key = %s", (key,))
+        db.commit()
+    cursor.close()
+    return removed
+
+
+# Copy a legacy flat upload into the store; returns its key
+def import_file(folder, filename, kind):
+    source = os.path.join(folder, filename)
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    key = blob_key(digest.hexdigest(), kind)
+    destination = os.path.join(folder, key)
+    if not os.path.exists(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(source, destination + '.tmp')
+        os.replace(destination + '.tmp', destination)
+    return key
@@ -0,0 +1,184 @@
+import pickle, threading, time
+from collections import OrderedDict
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # only needed when CACHE_REDIS_URL is set
+    redis = None
+
+
+# In-process read-through cache with TTL, an LRU size bound and tag invalidation.
+# Every entry is stored with the tags it depends on (e.g. "categories",
+# "products:category:3"); writes call invalidate_tags() to drop exactly those entries.
+class MemoryCache:
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._tags = {}  # tag -> set of keys
+        self._versions = {}  # tag -> invalidation count
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _unlink(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._unlink(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def _tag_versions(self, tags):
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    # `versions` are the tag versions read before the value was loaded; if a tag
+    # was invalidated in the meantime the (possibly stale) value is not stored
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            if versions is not None and self._tag_versions(tags) != versions:
+                return
+            if key in self._entries:
+                self._unlink(key)
+            self._entries[key] = (time.monotonic() + ttl, tuple(tags), value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._unlink(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._unlink(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    # Read-through: return the cached value or load, store and return it
+    def get_or_set(self, key, loader, ttl=None, tags=()):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            versions = self._tag_versions(tags)
+            value = loader()
+            self.set(key, value, ttl, tags, versions)
+        return value
+
+    # get_or_set with a coroutine function as the loader (asgi.py)
+    async def get_or_set_async(self, key, loader, ttl=None, tags=()):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            versions = self._tag_versions(tags)
+            value = await loader()
+            self.set(key, value, ttl, tags, versions)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Shared cache for multi-worker deployments. Tags are version counters in Redis: an entry
+# remembers the versions it was stored under and is a miss once any tag has been
+# bumped, so invalidation is one INCR per tag and is seen by every worker.
+# Size bounds come from the Redis server's maxmemory / allkeys-lru policy.
+class RedisCache(MemoryCache):
+    def __init__(self, url, default_ttl=300, prefix='memorieo:'):
+        super().__init__(max_entries=0, default_ttl=default_ttl)
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return []
+        return [int(v or 0) for v in self.client.mget([f'{self.prefix}tag:{t}' for t in tags])]
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        if raw is not None:
+            tags, versions, value = pickle.loads(raw)
+            if self._tag_versions(tags) == versions:
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = list(tags)
+        current = self._tag_versions(tags)
+        if versions is not None and current != versions:
+            return
+        payload = pickle.dumps((tags, current, value))
+        self.client.set(self.prefix + key, payload, ex=max(1, int(ttl)))
+
+    def invalidate_tags(self, *tags):
+        if tags:
+            pipe = self.client.pipeline()
+            for tag in tags:
+                pipe.incr(f'{self.prefix}tag:{tag}')
+            pipe.execute()
+            with self._lock:
+                self.invalidations += len(tags)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend='redis', entries=None, max_entries=None, evictions=None)
+        return stats
+
+
+def init_cache(app):
+    app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+    app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+    app.config.setdefault('CACHE_REDIS_URL', None)
+
+    if app.config['CACHE_REDIS_URL']:
+        if redis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but the 'redis' package is not installed")
+        app.extensions['cache'] = RedisCache(app.config['CACHE_REDIS_URL'], app.config['CACHE_DEFAULT_TTL'])
+    else:
+        app.extensions['cache'] = MemoryCache(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_DEFAULT_TTL'])
+
+
+def get_cache():
+    return current_app.extensions['cache']
@@ -0,0 +1,167 @@
+from decimal import Decimal
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+# Cart changes as single statements on the unique (user_id, product_id) key
+# from migrations/008: adding is an upsert that increments, setting a quantity
+# is an upsert that overwrites, and a quantity of 0 removes the line. Nothing
+# here commits; callers apply a batch of changes in one transaction.
+#
+# Checkout snapshots: checkout prices the selected lines once and hands the
+# form a signed, expiring token of exactly those lines, prices and total.
+# place_order charges what the token says after checking each line's current
+# price and stock under lock (inventory.reserve_lines), so the buyer pays for
+# the lines they saw and the cart is not read and priced a second time.
+
+MAX_BATCH = 100
+
+
+class InvalidChange(ValueError):
+    pass
+
+
+def add(db, user_id, product_id, quantity=1):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO cart_items (user_id, product_id, quantity)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
+    """, (user_id, product_id, quantity))
+    cursor.close()
+
+
+# Validate [{'product_id': .., 'quantity': ..}, ...] into {product_id: quantity};
+# the last change for a product wins
+def parse_changes(changes):
+    if not isinstance(changes, list) or not changes:
+        raise InvalidChange('changes must be a non-empty list.')
+    if len(changes) > MAX_BATCH:
+        raise InvalidChange(f'At most {MAX_BATCH} changes per request.')
+    parsed = {}
+    for change in changes:
+        try:
+            product_id = int(change['product_id'])
+            quantity = int(change['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidChange('Each change needs an integer product_id and quantity.')
+        if quantity < 0:
+            raise InvalidChange('Quantities cannot be negative.')
+        parsed[product_id] = quantity
+    return parsed
+
+
+# Apply {product_id: quantity} in two statements: one multi-row upsert for the
+# quantities (live products only) and one delete for the zeros
+def apply_changes(db, user_id, changes):
+    cursor = db.cursor()
+    updates = [(product_id, quantity) for product_id, quantity in changes.items() if quantity > 0]
+    removals = [product_id for product_id, quantity in changes.items() if quantity == 0]
+    if updates:
+        rows = ' UNION ALL '.join(['SELECT %s AS product_id, %s AS quantity'] * len(updates))
+        cursor.execute(f"""
+            INSERT INTO cart_items (user_id, product_id, quantity)
+            SELECT %s, p.id, c.quantity
+            FROM ({rows}) c
+            JOIN products p ON p.id = c.product_id AND p.is_archive = 0
+            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+        """, [user_id] + [value for update in updates for value in update])
+    if removals:
+        placeholders = ', '.join(['%s'] * len(removals))
+        cursor.execute(f"DELETE FROM cart_items WHERE user_id = %s AND product_id IN ({placeholders})",
+                       [user_id] + removals)
+    cursor.close()
+
+
+# (sql, params) for the cart page: id, name, price and quantity of each line
+def cart_page_query(user_id):
+    return """
+        SELECT 
+            ci.product_id AS id,
+            p.product_name AS name,
+            p.price AS price,
+            ci.quantity AS quantity
+        FROM 
+            cart_items ci
+        JOIN 
+            products p ON ci.product_id = p.id
+        WHERE 
+            ci.user_id = %s
+    """, (user_id,)
+
+
+# (sql, params) for the lines offered at checkout: the whole cart, or only
+# the selected products
+def checkout_lines_query(user_id, product_ids=None):
+    sql = """
+        SELECT c.product_id, c.quantity, p.product_name, p.price, (c.quantity * p.price) as total 
+        FROM cart_items c
+        JOIN products p ON c.product_id = p.id
+        WHERE c.user_id = %s
+    """
+    if not product_ids:
+        return sql, (user_id,)
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    return sql + f" AND c.product_id IN ({placeholders})", (user_id,) + tuple(product_ids)
+
+
+# The cart's lines and totals after a change, for JSON responses
+def summary(db, user_id):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT ci.product_id, p.product_name, p.price, ci.quantity
+        FROM cart_items ci
+        JOIN products p ON ci.product_id = p.id
+        WHERE ci.user_id = %s
+        ORDER BY ci.id
+    """, (user_id,))
+    items = cursor.fetchall()
+    cursor.close()
+    total = sum((item['price'] * item['quantity'] for item in items), Decimal(0))
+    return {
+        'items': [
+            {
+                'product_id': item['product_id'],
+                'product_name': item['product_name'],
+                'price': str(item['price']),
+                'quantity': item['quantity'],
+                'line_total': str(item['price'] * item['quantity']),
+            }
+            for item in items
+        ],
+        'count': len(items),
+        'total_quantity': sum(item['quantity'] for item in items),
+        'total_price': str(total),
+    }
+
+
+class InvalidSnapshot(Exception):
+    pass
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='checkout-snapshot')
+
+
+# Signed token for checkout lines [{'product_id', 'quantity', 'price', ...}]. It
+# carries no total: place_order sums the lines once their prices are verified.
+def create_snapshot(user_id, items):
+    lines = [[item['product_id'], item['quantity'], str(item['price'])] for item in items]
+    return _serializer().dumps({'user_id': user_id, 'lines': lines})
+
+
+# The snapshot's lines [(product_id, quantity, Decimal price)], or InvalidSnapshot
+# when it is forged, expired or belongs to someone else
+def load_snapshot(token, user_id):
+    try:
+        data = _serializer().loads(token or '', max_age=current_app.config['CHECKOUT_SNAPSHOT_TTL'])
+    except SignatureExpired:
+        raise InvalidSnapshot('Your checkout has expired. Please review your order again.')
+    except BadSignature:
+        raise InvalidSnapshot('Your checkout could not be verified. Please review your order again.')
+    if data.get('user_id') != user_id or not data.get('lines'):
+        raise InvalidSnapshot('Your checkout could not be verified. Please review your order again.')
+    lines = [(int(product_id), int(quantity), Decimal(price)) for product_id, quantity, price in data['lines']]
+    if any(quantity < 1 for _, quantity, _ in lines):
+        raise InvalidSnapshot('Your checkout could not be verified. Please review your order again.')
+    return lines
@@ -0,0 +1,114 @@
+import base64, json
+from search import product_search
+
+# Keyset (cursor) pagination for the product grid. Each sort order is backed by
+# an (is_archive, [category_id,] column, id) index from migrations/003, so the
+# query for any page is an index range scan of per_page + 1 rows, however deep
+# the page is.
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+# sort key -> (column, direction, label)
+PRODUCT_SORTS = {
+    'newest': ('created_at', 'DESC', 'Newest'),
+    'price_asc': ('price', 'ASC', 'Price: Low to High'),
+    'price_desc': ('price', 'DESC', 'Price: High to Low'),
+    'name': ('product_name', 'ASC', 'Name'),
+}
+DEFAULT_SORT = 'newest'
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+# [sort value, id] from a cursor token, or None when the token is missing or was
+# not made by encode_cursor. `kinds` are the types the sort value may have:
+# dates, prices and names come back as strings, ids and relevance as numbers.
+def decode_cursor(token, kinds=(str, int, float)):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    value, row_id = values
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        return None
+    if isinstance(row_id, bool) or not isinstance(row_id, int):
+        return None
+    return values
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+# SQL for one page of non-archived products. `after` is the cursor from the
+# previous page. Returns (sql, params, sort_column); the rows go through
+# finish_page(). `columns` must include id and the sort column. Full-text
+# searches are ordered by relevance, with the same keyset scheme.
+def product_page_query(category_id='all', search_query='', sort=DEFAULT_SORT,
+                       after=None, per_page=DEFAULT_PAGE_SIZE, columns='*'):
+    conditions = ["is_archive = 0"]
+    params = []
+    if category_id not in (None, '', 'all'):
+        conditions.append("category_id = %s")
+        params.append(category_id)
+
+    sort_column, direction = PRODUCT_SORTS.get(sort, PRODUCT_SORTS[DEFAULT_SORT])[:2]
+    sort_expr = sort_column
+    sort_params = []
+    select_extra = ""
+    if search_query:
+        search_condition, search_params, relevance = product_search(search_query)
+        if search_condition:
+            conditions.append(search_condition)
+            params.extend(search_params)
+            if relevance:
+                sort_expr, sort_column, direction, sort_params = relevance, 'relevance', 'DESC', search_params
+                select_extra = f", {relevance} AS relevance"
+
+    # Strict "after" comparison on (sort value, id); id breaks ties so the order is total
+    last = decode_cursor(after, (int, float) if sort_column == 'relevance' else str)
+    if last is not None:
+        op = '<' if direction == 'DESC' else '>'
+        conditions.append(f"({sort_expr} {op} %s OR ({sort_expr} = %s AND id {op} %s))")
+        params.extend(sort_params + [last[0]] + sort_params + [last[0], last[1]])
+
+    sql = f"""
+        SELECT {columns}{select_extra}
+        FROM products
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {sort_expr} {direction}, id {direction}
+        LIMIT %s
+    """
+    return sql, sort_params + params + sort_params + [per_page + 1], sort_column
+
+
+# (rows, next_cursor) from the per_page + 1 rows of a page query; next_cursor is
+# None on the last page
+def finish_page(rows, sort_column, per_page=DEFAULT_PAGE_SIZE):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([rows[-1][sort_column], rows[-1]['id']])
+    return rows, next_cursor
+
+
+# One page of non-archived products as (rows, next_cursor); see product_page_query.
+# `cursor` must be a dictionary cursor.
+def fetch_product_page(cursor, category_id='all', search_query='', sort=DEFAULT_SORT,
+                       after=None, per_page=DEFAULT_PAGE_SIZE, columns='*'):
+    sql, params, sort_column = product_page_query(category_id, search_query, sort, after, per_page, columns)
+    cursor.execute(sql, params)
+    return finish_page(cursor.fetchall(), sort_column, per_page)
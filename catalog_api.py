@@ -0,0 +1,92 @@
+import datetime, decimal, hashlib, json
+
+from catalog import PRODUCT_SORTS
+
+try:
+    import orjson
+except ImportError:  # optional: faster serialization, same output
+    orjson = None
+
+# Helpers for the read-only JSON catalog (/api/products). Clients pick the
+# fields they need with ?fields=; only the columns behind those fields are
+# selected. Prices are strings so the decimal value survives JSON unchanged.
+# Bodies are serialized once and cached with their ETag, so a revalidation is
+# answered with 304 before the database is touched.
+
+# API field -> product columns it is built from
+FIELDS = {
+    'id': ('id',),
+    'product_name': ('product_name',),
+    'price': ('price',),
+    'size': ('size',),
+    'pages': ('pages',),
+    'stock': ('stock',),
+    'category_id': ('category_id',),
+    'image_url': ('image_path', 'image_width'),
+    'image_srcset': ('image_path', 'image_width'),
+    'image_width': ('image_width',),
+    'image_height': ('image_height',),
+    'created_at': ('created_at',),
+}
+
+
+class InvalidParameter(ValueError):
+    pass
+
+
+# Requested field names in order; all fields when the parameter is missing
+def parse_fields(value):
+    if not value:
+        return list(FIELDS)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in FIELDS:
+            raise InvalidParameter(f'Unknown field: {name}')
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+# SELECT list for the fields, plus the id and sort column pagination needs
+def select_columns(fields, sort=None):
+    columns = ['id']
+    if sort in PRODUCT_SORTS:
+        columns.append(PRODUCT_SORTS[sort][0])
+    for field in fields:
+        columns.extend(FIELDS[field])
+    return ', '.join(dict.fromkeys(columns))
+
+
+def _value(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+# One product row as an API object. image_url/image_srcset are callables
+# (filename, original width) -> str so URLs match the HTML pages.
+def serialize(row, fields, image_url, image_srcset):
+    item = {}
+    for field in fields:
+        if field == 'image_url':
+            item[field] = image_url(row['image_path'], row['image_width']) if row['image_path'] else None
+        elif field == 'image_srcset':
+            item[field] = image_srcset(row['image_path'], row['image_width']) or None
+        else:
+            item[field] = _value(row[field])
+    return item
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+# (body bytes, etag) for a payload
+def encode(payload):
+    body = dumps(payload)
+    return body, hashlib.sha256(body).hexdigest()[:32]
@@ -0,0 +1,230 @@
+import os, threading, time
+from collections import deque
+import mysql.connector
+from flask import g, current_app
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Connections a forked child inherited from its parent's pool. They are kept
+# referenced so they are never garbage-collected in the child: mysql.connector's
+# socket __del__ calls shutdown(SHUT_RDWR), which would end the TCP session the
+# parent is still using.
+_inherited = []
+
+
+# Thread-safe MySQL connection pool with overflow, checkout timeout and health checks.
+# Connections are opened lazily, so creating the pool never touches the database,
+# and a forked child never uses the connections its parent held.
+class ConnectionPool:
+    def __init__(self, size=5, max_overflow=10, timeout=30, recycle=3600, pre_ping=True, **connect_args):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.connect_args = connect_args
+
+        self._idle = deque()  # (connection, created_at)
+        self._created_at = {}  # id(connection) -> created_at
+        self._open = 0
+        self._lock = threading.Condition()
+        self._pid = os.getpid()
+
+        # Counters used to size the pool
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.health_check_failures = 0
+        self.peak_checked_out = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.connect_args)
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        created_at = self._created_at.get(id(conn), 0)
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            self.health_check_failures += 1
+            return False
+
+    # In a forked child the parent's sockets are shared with the parent, so the
+    # child starts empty and parks the idle ones in _inherited untouched. The pool
+    # should be empty at fork time (warmup disposes it); anything else is a bug.
+    def _after_fork(self):
+        if self._pid != os.getpid():
+            open_at_fork = self._open
+            _inherited.extend(self._idle)
+            self._lock = threading.Condition()
+            self._idle.clear()
+            self._created_at.clear()
+            self._open = 0
+            self._pid = os.getpid()
+            assert not open_at_fork, (f'{open_at_fork} pooled connection(s) were open when the process '
+                                      'forked; dispose() the pool before forking')
+
+    def checkout(self):
+        self._after_fork()
+        start = time.monotonic()
+        waited = False
+        with self._lock:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    # Reserve the slot before connecting outside the lock
+                    self._open += 1
+                    conn = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+                self._lock.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+        wait_time = time.monotonic() - start
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+        return conn
+
+    def checkin(self, conn):
+        # Never hand a connection with an open transaction to the next request
+        try:
+            conn.rollback()
+            healthy = True
+        except mysql.connector.Error:
+            healthy = False
+
+        with self._lock:
+            if healthy and len(self._idle) < self.size:
+                self._idle.append(conn)
+            else:
+                # Overflow connections are closed once the burst is over
+                self._open -= 1
+                self._discard(conn)
+            self._lock.notify()
+
+    @property
+    def checked_out(self):
+        return self._open - len(self._idle)
+
+    def stats(self):
+        with self._lock:
+            checked_out = self.checked_out
+            capacity = self.size + self.max_overflow
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'timeout': self.timeout,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': checked_out,
+                'overflow': max(0, self._open - self.size),
+                'peak_checked_out': self.peak_checked_out,
+                'utilization': checked_out / capacity if capacity else 0.0,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'health_check_failures': self.health_check_failures,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_avg': self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                'wait_time_max': self.wait_time_max,
+            }
+
+    def dispose(self):
+        self._after_fork()
+        with self._lock:
+            while self._idle:
+                self._open -= 1
+                self._discard(self._idle.pop())
+
+
+def init_db(app):
+    app.config.setdefault('MYSQL_HOST', 'localhost')
+    app.config.setdefault('MYSQL_USER', 'root')
+    app.config.setdefault('MYSQL_PASSWORD', '')
+    app.config.setdefault('MYSQL_DATABASE', 'ecommerce_db_backup')
+    app.config.setdefault('DB_POOL_SIZE', 5)
+    app.config.setdefault('DB_POOL_MAX_OVERFLOW', 10)
+    app.config.setdefault('DB_POOL_TIMEOUT', 30)
+    app.config.setdefault('DB_POOL_RECYCLE', 3600)
+    app.config.setdefault('DB_POOL_PRE_PING', True)
+
+    app.extensions['db_pool'] = ConnectionPool(
+        size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_POOL_MAX_OVERFLOW'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        recycle=app.config['DB_POOL_RECYCLE'],
+        pre_ping=app.config['DB_POOL_PRE_PING'],
+        host=app.config['MYSQL_HOST'],
+        user=app.config['MYSQL_USER'],
+        password=app.config['MYSQL_PASSWORD'],
+        database=app.config['MYSQL_DATABASE'],
+    )
+    app.teardown_appcontext(close_db)
+
+
+def get_pool():
+    return current_app.extensions['db_pool']
+
+
+# Connection scoped to the current request, returned to the pool at teardown.
+# An extension can register app.extensions['db_connection_wrapper'] to wrap it
+# (metrics.py does, to time every query).
+def get_db():
+    if 'db' not in g:
+        conn = get_pool().checkout()
+        wrapper = current_app.extensions.get('db_connection_wrapper')
+        g.db = wrapper(conn) if wrapper else conn
+    return g.db
+
+
+def get_cursor(dictionary=False):
+    return get_db().cursor(dictionary=dictionary)
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().checkin(getattr(conn, 'wrapped', conn))
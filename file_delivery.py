@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+import blobstore
+
+# Delivery of uploaded files (product photos, their variants, seller documents).
+# Every response carries a strong ETag derived from the file's SHA-256, so
+# revalidation answers 304 without a body, and Range requests get 206 partial
+# responses (both handled by send_file's conditional mode). URLs built with
+# version_args() carry ?v=<hash prefix>; when that matches the file on disk the
+# response is cacheable for a year as immutable, otherwise clients revalidate.
+# Blob store keys (blobstore.py) name their own hash, so they are immutable as is.
+# With USE_X_SENDFILE the body is handed to the front server (X-Sendfile);
+# otherwise send_file passes the open file to the WSGI server's file_wrapper,
+# which gunicorn and uWSGI turn into sendfile(2).
+
+VERSION_LENGTH = 16
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_CHUNK = 1024 * 1024
+
+# path -> (mtime_ns, size, sha256 hex); a file is rehashed only when it changes
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def resolve(directory, filename):
+    path = safe_join(os.path.join(current_app.root_path, directory), filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def content_hash(path):
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached and cached[:2] == key:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hashes_lock:
+        _hashes[path] = key + (value,)
+    return value
+
+
+def content_version(directory, filename):
+    path = resolve(directory, filename)
+    return content_hash(path)[:VERSION_LENGTH] if path else None
+
+
+# Query arguments to append to a file URL so it can be cached as immutable
+def version_args(directory, filename):
+    if blobstore.key_digest(filename):
+        return {}
+    version = content_version(directory, filename)
+    return {'v': version} if version else {}
+
+
+def send(directory, filename, private=False):
+    path = resolve(directory, filename)
+    if path is None:
+        abort(404)
+    digest = blobstore.key_digest(filename)
+    immutable = digest is not None
+    if digest is None:
+        digest = content_hash(path)
+        immutable = request.args.get('v') == digest[:VERSION_LENGTH]
+
+    response = send_file(path, etag=digest, conditional=True)
+    cache_control = response.cache_control
+    if private:
+        cache_control.private = True
+        cache_control.no_cache = True
+    elif immutable:
+        cache_control.no_cache = None
+        cache_control.public = True
+        cache_control.max_age = IMMUTABLE_MAX_AGE
+        cache_control.immutable = True
+    else:
+        cache_control.public = True
+        cache_control.no_cache = True
+    return response
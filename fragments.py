@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from cache import get_cache
+
+# Template compilation and fragment caching for the product grid.
+#
+# Compiled templates are kept in a bytecode cache on disk
+# (JINJA_BYTECODE_CACHE_DIR, shared by every worker), so a fresh worker loads
+# them instead of recompiling every template on its first requests. Jinja still
+# compares each template's mtime, so edited templates are picked up as before.
+#
+# Each product card is rendered once and cached as a string. The key holds the
+# product id and a digest of the fields the card shows, so an edited row never
+# serves an old card, even from another worker. The entries are tagged
+# product:<id>, which edit_product and the archive routes invalidate.
+
+CARD_TEMPLATE = '_product_card.html'
+CARD_FIELDS = ('id', 'product_name', 'price', 'size', 'pages', 'image_path', 'image_width', 'image_height')
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def card_version(product):
+    values = [product.get(field) for field in CARD_FIELDS]
+    return hashlib.sha256(json.dumps(values, default=str).encode()).hexdigest()[:16]
+
+
+# The rendered card for a product row (a dict with at least CARD_FIELDS)
+def product_card(product):
+    def render():
+        template = current_app.jinja_env.get_template(CARD_TEMPLATE)
+        return template.render(product=product)
+
+    html = get_cache().get_or_set(
+        f"card:{product['id']}:{card_version(product)}", render,
+        ttl=current_app.config['FRAGMENT_CACHE_TTL'], tags=(product_tag(product['id']),),
+    )
+    return Markup(html)
+
+
+def init_fragments(app):
+    app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 3600)
+
+    directory = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.add_template_global(product_card)
@@ -0,0 +1,54 @@
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # without Pillow uploads are served at their original size
+    Image = None
+
+# Responsive variants of uploaded product photos. Each upload is decoded once
+# and resized to the widths below as WebP, stored next to the uploads as
+# variants/<name>.<width>.webp. Widths larger than the original are skipped.
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_DIR = 'variants'
+VARIANT_FORMAT = 'WEBP'
+VARIANT_QUALITY = 80
+
+
+def variant_name(filename, width):
+    return f'{VARIANT_DIR}/{filename}.{width}.webp'
+
+
+# Widths with a variant for an upload whose original width is known. The width is
+# stored (products.image_width) only after generate_variants() succeeded, so
+# templates can build URLs without touching the filesystem.
+def variant_widths(original_width):
+    if not original_width:
+        return []
+    return [width for width in VARIANT_WIDTHS if width < original_width]
+
+
+# Decode the upload once and write every variant. Returns the original
+# (width, height), or None if Pillow is missing or the file is not an image.
+def generate_variants(upload_folder, filename):
+    if Image is None or not filename:
+        return None
+    source = os.path.join(upload_folder, filename)
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            width, height = image.size
+
+            # Largest first, each resize starting from the previous one
+            for variant_width in sorted(VARIANT_WIDTHS, reverse=True):
+                if variant_width >= width:
+                    continue
+                variant_height = max(1, round(height * variant_width / width))
+                image = image.resize((variant_width, variant_height), Image.LANCZOS)
+                destination = os.path.join(upload_folder, variant_name(filename, variant_width))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                image.save(destination, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            return width, height
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+import blobstore
+
+# Streaming upload ingestion. Multipart file parts are written straight into
+# <UPLOAD_FOLDER>/.incoming/ as they arrive from the client (no in-memory or
+# /tmp spool), hashed with SHA-256 on the way, and cut off as soon as they
+# exceed UPLOAD_MAX_FILE_SIZE or their first bytes are not an allowed type.
+# MAX_CONTENT_LENGTH bounds the whole request before any of that starts.
+# store() then moves the finished file into the content-addressed store (see
+# blobstore.py), or drops it if that content is already there; anything not
+# stored is deleted when the request ends.
+
+INCOMING_DIR = '.incoming'
+CHUNK_SIZE = 64 * 1024
+SNIFF_LENGTH = 12
+
+IMAGE_KINDS = ('jpeg', 'png', 'gif', 'webp')
+DOCUMENT_KINDS = IMAGE_KINDS + ('pdf',)
+
+EXTENSIONS = {
+    'jpg': 'jpeg', 'jpeg': 'jpeg', 'jfif': 'jpeg', 'png': 'png',
+    'gif': 'gif', 'webp': 'webp', 'pdf': 'pdf',
+}
+
+
+class UploadRejected(Exception):
+    pass
+
+
+# File type from its first bytes, or None
+def sniff(head):
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    return None
+
+
+def extension_kind(filename):
+    _, _, extension = (filename or '').rpartition('.')
+    return EXTENSIONS.get(extension.lower())
+
+
+# Writable container handed to the multipart parser for one file part
+class IncomingFile:
+    def __init__(self, folder, filename, max_size):
+        os.makedirs(os.path.join(folder, INCOMING_DIR), exist_ok=True)
+        self.path = os.path.join(folder, INCOMING_DIR, uuid.uuid4().hex)
+        self.filename = filename
+        self.max_size = max_size
+        self.size = 0
+        self.kind = None
+        self.stored = False
+        self._head = b''
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.discard()
+            raise RequestEntityTooLarge(f'{self.filename} is larger than {self.max_size / (1024 * 1024):g} MB.')
+        if self.kind is None and len(self._head) < SNIFF_LENGTH:
+            self._head += data[:SNIFF_LENGTH - len(self._head)]
+            if len(self._head) == SNIFF_LENGTH:
+                self._check_kind()
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _check_kind(self):
+        self.kind = sniff(self._head)
+        if self.kind is None or self.kind != extension_kind(self.filename):
+            self.discard()
+            raise UnsupportedMediaType(f'{self.filename} is not a supported file type.')
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    # Files shorter than the sniff window are typed when the part ends
+    def finish(self):
+        if self.kind is None:
+            self._check_kind()
+
+    def commit(self, destination):
+        self._file.close()
+        os.replace(self.path, destination)
+        self.stored = True
+
+    def close(self):
+        if not self.stored:
+            self.discard()
+
+    def discard(self):
+        self._file.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:  # empty file input
+            return io.BytesIO()
+        if extension_kind(filename) is None:
+            raise UnsupportedMediaType(f'{filename} is not a supported file type.')
+        incoming = IncomingFile(current_app.config['UPLOAD_FOLDER'], filename,
+                                current_app.config.get('UPLOAD_MAX_FILE_SIZE'))
+        self.__dict__.setdefault('incoming_files', []).append(incoming)
+        return incoming
+
+    def close(self):
+        super().close()
+        for incoming in self.__dict__.get('incoming_files', ()):
+            incoming.close()
+
+
+def init_uploads(app):
+    app.config.setdefault('UPLOAD_MAX_FILE_SIZE', 10 * 1024 * 1024)
+    app.config.setdefault('MAX_CONTENT_LENGTH', 25 * 1024 * 1024)
+    app.request_class = UploadRequest
+
+
+# Move an uploaded file into the blob store. Returns (blob key, sha256 hex);
+# raises UploadRejected for a disallowed type.
+def store(file_storage, kinds=DOCUMENT_KINDS):
+    folder = current_app.config['UPLOAD_FOLDER']
+    incoming = file_storage.stream
+    if not isinstance(incoming, IncomingFile):
+        # Not parsed by UploadRequest (e.g. built by hand): stream it through one
+        incoming = IncomingFile(folder, file_storage.filename, current_app.config.get('UPLOAD_MAX_FILE_SIZE'))
+        try:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                incoming.write(chunk)
+        except (RequestEntityTooLarge, UnsupportedMediaType) as e:
+            raise UploadRejected(e.description)
+
+    try:
+        incoming.finish()
+    except UnsupportedMediaType as e:
+        raise UploadRejected(e.description)
+    if incoming.kind not in kinds:
+        incoming.discard()
+        raise UploadRejected(f'{file_storage.filename} is not a supported file type.')
+
+    digest = incoming.hexdigest()
+    key = blobstore.blob_key(digest, incoming.kind)
+    destination = os.path.join(folder, key)
+    try:
+        os.utime(destination)  # already stored; a fresh mtime keeps it clear of gc
+        incoming.discard()
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        incoming.commit(destination)
+    return key, digest
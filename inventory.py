@@ -0,0 +1,71 @@
+# Stock is decremented atomically when an order is placed and restored when it
+# is cancelled. Product rows are always locked in primary-key order, so checkouts
+# over overlapping carts queue behind each other instead of deadlocking, and the
+# locks are held only for the rest of the (short) order transaction.
+# Like seller_stats, nothing here commits: callers run it inside their transaction.
+
+
+# Lock the given products in id order: {product_id: (product_name, stock, is_archive, price)}
+def lock_products(db, product_ids):
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    cursor = db.cursor()
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(f"""
+        SELECT id, product_name, stock, is_archive, price
+        FROM products
+        WHERE id IN ({placeholders})
+        ORDER BY id
+        FOR UPDATE
+    """, product_ids)
+    rows = {row[0]: row[1:] for row in cursor.fetchall()}
+    cursor.close()
+    return rows
+
+
+# Take the stock for priced checkout lines [(product_id, quantity, price)]
+# (carts.load_snapshot). Returns (short, repriced): names of products without
+# enough stock and of those whose price is no longer the one the buyer saw.
+# Nothing is decremented unless both are empty.
+def reserve_lines(db, lines):
+    products = lock_products(db, [product_id for product_id, _, _ in lines])
+    short, repriced = [], []
+    for product_id, quantity, price in sorted(lines):
+        product = products.get(product_id)
+        if product is None or product[2] or product[1] < quantity:
+            short.append(product[0] if product else f'Product #{product_id}')
+        elif product[3] != price:
+            repriced.append(product[0])
+    if short or repriced or not lines:
+        return short, repriced
+
+    # One conditional decrement for every line; the guard holds under the locks above
+    cursor = db.cursor()
+    rows = ' UNION ALL '.join(['SELECT %s AS product_id, %s AS quantity'] * len(lines))
+    cursor.execute(f"""
+        UPDATE products p
+        JOIN ({rows}) c ON c.product_id = p.id
+        SET p.stock = p.stock - c.quantity
+        WHERE p.stock >= c.quantity
+    """, [value for product_id, quantity, _ in lines for value in (product_id, quantity)])
+    cursor.close()
+    return [], []
+
+
+# Put an order's quantities back into stock (cancellation)
+def release_order(db, order_id):
+    cursor = db.cursor()
+    cursor.execute("SELECT DISTINCT product_id FROM order_items WHERE order_id = %s", (order_id,))
+    lock_products(db, [row[0] for row in cursor.fetchall()])
+    cursor.execute("""
+        UPDATE products p
+        JOIN (
+            SELECT product_id, SUM(quantity) AS quantity
+            FROM order_items
+            WHERE order_id = %s
+            GROUP BY product_id
+        ) oi ON oi.product_id = p.id
+        SET p.stock = p.stock + oi.quantity
+    """, (order_id,))
+    cursor.close()
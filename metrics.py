@@ -0,0 +1,287 @@
+import hmac
+import re
+import threading
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+
+# Request and SQL instrumentation. Every connection handed out by get_db() is
+# wrapped so each cursor execute is timed and its rows counted against the
+# current request; the per-route totals, request latency histograms, in-flight
+# requests and the connection pool numbers are served in the Prometheus text
+# format on /metrics. A statement run SQL_N_PLUS_ONE_THRESHOLD times or more in
+# one request (a query inside a loop) is logged and counted as a possible N+1.
+# Numbers are per process: with several workers, scrape each one or sum them.
+#
+# /metrics lists every route, its SQL counts and the pool numbers, so it is only
+# served to a scraper with METRICS_TOKEN as a bearer token or from an address in
+# METRICS_ALLOWED_IPS. With neither configured it answers 404.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+\b")
+
+
+# Statement shape: whitespace collapsed, inline literals replaced
+def normalize(sql):
+    return _LITERALS.sub('?', ' '.join(str(sql).split()))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = {}  # (method, route, status) -> count
+        self.latency = {}  # route -> Histogram
+        self.queries = {}  # route -> Histogram of queries per request
+        self.db = {}  # route -> [queries, seconds, rows]
+        self.n_plus_one = {}  # route -> count
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method, route, status, seconds, sql):
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(route, Histogram(QUERY_COUNT_BUCKETS)).observe(sql.queries)
+            self._add_db(route, sql)
+
+    # Queries run outside a request (CLI commands, background tasks)
+    def record_queries(self, route, sql):
+        with self._lock:
+            self._add_db(route, sql)
+
+    def _add_db(self, route, sql):
+        totals = self.db.setdefault(route, [0, 0.0, 0])
+        totals[0] += sql.queries
+        totals[1] += sql.seconds
+        totals[2] += sql.rows
+        if sql.repeated:
+            self.n_plus_one[route] = self.n_plus_one.get(route, 0) + len(sql.repeated)
+
+    def render(self, pool_stats=None):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        def histogram(name, help_text, histograms):
+            samples = []
+            for route, h in sorted(histograms.items()):
+                for bound, count in zip(h.buckets, h.counts):
+                    samples.append(((('route', route), ('le', bound)), count))
+                samples.append(((('route', route), ('le', '+Inf')), h.count))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f'{name}_bucket{{{label_text}}} {value}')
+            for route, h in sorted(histograms.items()):
+                lines.append(f'{name}_sum{{route="{_escape(route)}"}} {h.sum}')
+                lines.append(f'{name}_count{{route="{_escape(route)}"}} {h.count}')
+
+        with self._lock:
+            metric('http_requests_in_flight', 'gauge', 'Requests being handled.', [((), self.in_flight)])
+            metric('http_requests_total', 'counter', 'Requests handled.',
+                   [((('method', m), ('route', r), ('status', s)), n) for (m, r, s), n in sorted(self.requests.items())])
+            histogram('http_request_duration_seconds', 'Request latency.', self.latency)
+            histogram('db_queries_per_request', 'SQL statements executed per request.', self.queries)
+            metric('db_queries_total', 'counter', 'SQL statements executed.',
+                   [((('route', r),), t[0]) for r, t in sorted(self.db.items())])
+            metric('db_query_duration_seconds_total', 'counter', 'Time spent in SQL statements.',
+                   [((('route', r),), round(t[1], 6)) for r, t in sorted(self.db.items())])
+            metric('db_rows_total', 'counter', 'Rows returned by SQL statements.',
+                   [((('route', r),), t[2]) for r, t in sorted(self.db.items())])
+            metric('db_n_plus_one_total', 'counter', 'Statements repeated enough in one request to look like N+1.',
+                   [((('route', r),), n) for r, n in sorted(self.n_plus_one.items())])
+
+        if pool_stats:
+            for key in ('size', 'open', 'idle', 'checked_out', 'overflow', 'utilization'):
+                if key in pool_stats:
+                    metric(f'db_pool_{key}', 'gauge', f'Connection pool {key.replace("_", " ")}.', [((), pool_stats[key])])
+            for key in ('checkouts', 'waits', 'timeouts', 'health_check_failures'):
+                if key in pool_stats:
+                    metric(f'db_pool_{key}_total', 'counter', f'Connection pool {key.replace("_", " ")}.',
+                           [((), pool_stats[key])])
+            if 'wait_time_total' in pool_stats:
+                metric('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.',
+                       [((), round(pool_stats['wait_time_total'], 6))])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# SQL done on behalf of one request (or one app context outside requests)
+class SQLStats:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.statements = {}  # normalized statement -> executions
+        self.repeated = []
+
+    def executed(self, sql, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        shape = normalize(sql)
+        count = self.statements.get(shape, 0) + 1
+        self.statements[shape] = count
+        if count == self.threshold:
+            self.repeated.append(shape)
+            current_app.logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+                                       _route(), count, shape[:200])
+
+
+def _route():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+def _sql_stats():
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = g.sql_stats = SQLStats(current_app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+    return stats
+
+
+# Count a statement run outside get_db() for the current request (asgi.py's
+# async connections)
+def record_query(sql, seconds, rows=0):
+    stats = _sql_stats()
+    stats.executed(sql, seconds)
+    stats.rows += rows
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self.wrapped = cursor
+
+    def _timed(self, method, operation, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            _sql_stats().executed(operation, time.perf_counter() - start)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self.wrapped.execute, operation, *args, **kwargs)
+
+    # One round of statements however many rows, so counted once
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self.wrapped.executemany, operation, *args, **kwargs)
+
+    def _fetched(self, rows):
+        _sql_stats().rows += rows
+
+    def fetchone(self):
+        row = self.wrapped.fetchone()
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.wrapped.fetchmany(*args, **kwargs)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.wrapped.fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, connection):
+        self.wrapped = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.wrapped.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+def init_metrics(app):
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 10)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('METRICS_ALLOWED_IPS', ())
+    metrics = app.extensions['metrics'] = Metrics()
+    app.extensions['db_connection_wrapper'] = InstrumentedConnection
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        metrics.started()
+
+    @app.after_request
+    def add_server_timing(response):
+        g.response_status = response.status_code
+        stats = g.get('sql_stats')
+        if stats is not None:
+            response.headers.add('Server-Timing', f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries"')
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc=None):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        status = g.get('response_status', 500 if exc is not None else 200)
+        stats = g.pop('sql_stats', None) or SQLStats(0)
+        metrics.finished(request.method, request.endpoint or 'unmatched', status,
+                         time.perf_counter() - started, stats)
+
+    @app.teardown_appcontext
+    def finish_context_metrics(exc=None):
+        stats = g.pop('sql_stats', None)
+        if stats is not None and stats.queries:
+            metrics.record_queries('none', stats)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        token = current_app.config['METRICS_TOKEN']
+        allowed_ips = current_app.config['METRICS_ALLOWED_IPS']
+        authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        if not authorized and request.remote_addr not in allowed_ips:
+            if token:
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+            return Response('Not Found\n', status=404, mimetype='text/plain')
+        pool = current_app.extensions.get('db_pool')
+        return Response(metrics.render(pool.stats() if pool else None),
+                        mimetype='text/plain; version=0.0.4')
+
+    return metrics
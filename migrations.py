@@ -0,0 +1,84 @@
+import os
+import re
+
+# Versioned schema migrations. Each migrations/NNN_name.sql file is applied
+# once, in version order, and recorded in schema_migrations. MySQL commits DDL
+# implicitly, so a file is recorded only after all of its statements have run;
+# keep each file safe to re-run from the top (or fix by hand) if one fails
+# half-way. Databases that were migrated by hand before this runner existed
+# are marked up to date with `flask db stamp <version>`.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+# [(version, name, path)] in version order
+def discover(directory=MIGRATIONS_DIR):
+    found = []
+    for filename in os.listdir(directory):
+        match = FILENAME.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return sorted(found)
+
+
+# Statements of a migration file: -- comment lines dropped, split on ; at line end
+def split_statements(text):
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith('--')]
+    statements = re.split(r';\s*$', '\n'.join(lines), flags=re.MULTILINE)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version int(11) NOT NULL,
+            name varchar(255) NOT NULL,
+            applied_at timestamp NOT NULL DEFAULT current_timestamp(),
+            PRIMARY KEY (version)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """)
+
+
+def applied_versions(db):
+    cursor = db.cursor()
+    _ensure_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+
+def pending(db):
+    done = applied_versions(db)
+    return [migration for migration in discover() if migration[0] not in done]
+
+
+# Apply pending migrations up to `target` (all when None); returns those applied
+def migrate(db, target=None, on_apply=None):
+    applied = []
+    for version, name, path in pending(db):
+        if target is not None and version > target:
+            break
+        if on_apply:
+            on_apply(version, name)
+        with open(path, encoding='utf-8') as f:
+            statements = split_statements(f.read())
+        cursor = db.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        db.commit()
+        cursor.close()
+        applied.append((version, name))
+    return applied
+
+
+# Record migrations up to `version` as applied without running them
+def stamp(db, version):
+    stamped = [(v, name) for v, name, _ in pending(db) if v <= version]
+    cursor = db.cursor()
+    cursor.executemany("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", stamped)
+    db.commit()
+    cursor.close()
+    return stamped
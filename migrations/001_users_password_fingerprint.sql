@@ -0,0 +1,7 @@
+-- Keyed password fingerprint (HMAC-SHA256, see password_fingerprint() in app.py).
+-- Backs the signup "password already in use" check with a unique index instead of
+-- running check_password_hash against every user. Existing rows stay NULL and are
+-- filled in lazily the next time each user logs in.
+ALTER TABLE `users`
+  ADD COLUMN `password_fingerprint` char(64) DEFAULT NULL AFTER `password`,
+  ADD UNIQUE KEY `password_fingerprint` (`password_fingerprint`);
@@ -0,0 +1,4 @@
+-- Full-text index for the buyer_dashboard search box (see search.py).
+-- Replaces the leading-wildcard LIKE scans on product_name/size/price.
+ALTER TABLE `products`
+  ADD FULLTEXT KEY `product_search` (`product_name`, `size`);
@@ -0,0 +1,10 @@
+-- Composite indexes for keyset pagination of the buyer product grid (catalog.py).
+-- One index per sort order, with and without the category filter, each ending
+-- in id so "next page" is a range scan that never sorts or skips rows.
+ALTER TABLE `products`
+  ADD KEY `idx_products_newest` (`is_archive`, `created_at`, `id`),
+  ADD KEY `idx_products_price` (`is_archive`, `price`, `id`),
+  ADD KEY `idx_products_name` (`is_archive`, `product_name`, `id`),
+  ADD KEY `idx_products_category_newest` (`is_archive`, `category_id`, `created_at`, `id`),
+  ADD KEY `idx_products_category_price` (`is_archive`, `category_id`, `price`, `id`),
+  ADD KEY `idx_products_category_name` (`is_archive`, `category_id`, `product_name`, `id`);
@@ -0,0 +1,13 @@
+-- Per-seller dashboard counters maintained by place_order, update_order_status,
+-- cancel_order and the product routes (see seller_stats.py). After applying,
+-- fill it with:  flask --app 'app:create_app()' seller-stats rebuild
+CREATE TABLE `seller_stats` (
+  `seller_id` int(11) NOT NULL,
+  `active_orders` int(11) NOT NULL DEFAULT 0,
+  `pending_orders` int(11) NOT NULL DEFAULT 0,
+  `total_stock` int(11) NOT NULL DEFAULT 0,
+  `total_sales` decimal(12,2) NOT NULL DEFAULT 0.00,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`seller_id`),
+  CONSTRAINT `seller_stats_ibfk_1` FOREIGN KEY (`seller_id`) REFERENCES `users` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -0,0 +1,6 @@
+-- Original dimensions of each product photo, set once its resized WebP variants
+-- exist (see images.py). Backfill existing products with:
+--   flask --app 'app:create_app()' images generate
+ALTER TABLE `products`
+  ADD COLUMN `image_width` int(11) DEFAULT NULL AFTER `image_path`,
+  ADD COLUMN `image_height` int(11) DEFAULT NULL AFTER `image_width`;
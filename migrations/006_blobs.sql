@@ -0,0 +1,11 @@
+-- Reference counts for the content-addressed upload store (see blobstore.py).
+-- Keys are paths like blobs/ab/cd/<sha256>.jpg held by products.image_path and
+-- seller_requests.id_proof/product_photo. After applying, move existing uploads
+-- in and count their references with:
+--   flask --app 'app:create_app()' blobs import
+CREATE TABLE `blobs` (
+  `blob_key` varchar(100) NOT NULL,
+  `refcount` int(11) NOT NULL DEFAULT 0,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`blob_key`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -0,0 +1,12 @@
+-- Indexes for the paginated admin dashboard listings (admin_lists.py): the
+-- status + role, role and unfiltered user listings and the seller request status
+-- listings. The status-only and name-sorted filtered listings need the 010
+-- indexes as well. The role/status counts read the first index only.
+ALTER TABLE `users`
+  ADD KEY `idx_users_status_role` (`status`, `role`, `id`),
+  ADD KEY `idx_users_role` (`role`, `id`),
+  ADD KEY `idx_users_name` (`name`, `id`);
+
+ALTER TABLE `seller_requests`
+  ADD KEY `idx_seller_requests_status` (`status`, `id`),
+  ADD KEY `idx_seller_requests_status_business_name` (`status`, `business_name`, `id`);
@@ -0,0 +1,32 @@
+-- Indexes for the remaining hot lookups (checked with `flask db explain`).
+-- products(is_archive, category_id ...), users(status, role ...) and
+-- seller_requests(status ...) are already prefixes of the 003 and 007 indexes.
+
+-- One cart line per (user, product): merge existing duplicates into the oldest
+-- line first. The unique key also serves the user_id foreign key.
+UPDATE cart_items c
+JOIN (
+    SELECT MIN(id) AS id, SUM(quantity) AS quantity
+    FROM cart_items
+    GROUP BY user_id, product_id
+    HAVING COUNT(*) > 1
+) d ON d.id = c.id
+SET c.quantity = d.quantity;
+
+DELETE c FROM cart_items c
+JOIN cart_items k ON k.user_id = c.user_id AND k.product_id = c.product_id AND k.id < c.id;
+
+ALTER TABLE `cart_items`
+  ADD UNIQUE KEY `uq_cart_items_user_product` (`user_id`, `product_id`),
+  DROP KEY `user_id`;
+
+-- Seller order lists join a seller's products to their lines and filter on the
+-- line status; covering (product_id, seller_status, order_id) answers that from
+-- the index and still serves the product_id foreign key.
+ALTER TABLE `order_items`
+  ADD KEY `idx_order_items_product_status` (`product_id`, `seller_status`, `order_id`),
+  DROP KEY `product_id`;
+
+-- Background image processing looks products up by their stored blob key
+ALTER TABLE `products`
+  ADD KEY `idx_products_image_path` (`image_path`);
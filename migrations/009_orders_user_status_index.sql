@@ -0,0 +1,6 @@
+-- Buyer order history tabs (order_history.py): each page is a range scan of
+-- one (user_id, status) prefix in created_at, id order, and the tab counts are
+-- read from the same index. It also serves the user_id foreign key.
+ALTER TABLE `orders`
+  ADD KEY `idx_orders_user_status_created` (`user_id`, `status`, `created_at`, `id`),
+  DROP KEY `user_id`;
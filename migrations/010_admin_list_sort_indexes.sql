@@ -0,0 +1,14 @@
+-- The rest of the admin listing indexes (admin_lists.py). With 007 every user
+-- filter (none, status, role, status + role) has an index of the equality
+-- columns followed by each offered sort column (id or name) and id, and so do
+-- the seller request status filters with business_name, so a page is a range
+-- scan in sort order. The name/email prefix search filters rows during that
+-- scan rather than narrowing it.
+ALTER TABLE `users`
+  ADD KEY `idx_users_status` (`status`, `id`),
+  ADD KEY `idx_users_status_name` (`status`, `name`, `id`),
+  ADD KEY `idx_users_role_name` (`role`, `name`, `id`),
+  ADD KEY `idx_users_status_role_name` (`status`, `role`, `name`, `id`);
+
+ALTER TABLE `seller_requests`
+  ADD KEY `idx_seller_requests_business_name` (`business_name`, `id`);
@@ -0,0 +1,89 @@
+from catalog import encode_cursor, decode_cursor
+
+# The buyer's order history, one status tab at a time. A page is one range scan
+# of the (user_id, status, created_at, id) index from migrations/009 plus one
+# query for the lines of just those orders, so it costs the same for a first
+# order as for a customer with years of history. The tab counts are one
+# GROUP BY over the same index, cached per user under orders_tag(user_id).
+
+ORDER_STATUSES = ('Pending', 'Shipped', 'Delivered', 'Cancelled')
+ORDERS_PER_PAGE = 10
+
+
+def orders_tag(user_id):
+    return f'orders:user:{user_id}'
+
+
+COUNTS_SQL = "SELECT status, COUNT(*) FROM orders WHERE user_id = %s GROUP BY status"
+
+
+# {status: count} for every status, zeros included, from COUNTS_SQL rows
+def counts_from_rows(rows):
+    counts = dict.fromkeys(ORDER_STATUSES, 0)
+    for status, total in rows:
+        if status in counts:
+            counts[status] = total
+    return counts
+
+
+def count_by_status(cursor, user_id):
+    cursor.execute(COUNTS_SQL, (user_id,))
+    return counts_from_rows(cursor.fetchall())
+
+
+# (sql, params) for one page of the user's orders with this status, newest first
+def orders_page_query(user_id, status, after=None, per_page=ORDERS_PER_PAGE):
+    conditions = ["user_id = %s", "status = %s"]
+    params = [user_id, status]
+    last = decode_cursor(after, str)
+    if last is not None:
+        conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params.extend([last[0], last[0], last[1]])
+    return f"""
+        SELECT id AS order_id, status, total_amount, payment_method, created_at
+        FROM orders
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, params + [per_page + 1]
+
+
+# (orders, next_cursor) from the per_page + 1 rows of orders_page_query
+def finish_orders_page(orders, per_page=ORDERS_PER_PAGE):
+    next_cursor = None
+    if len(orders) > per_page:
+        orders = orders[:per_page]
+        next_cursor = encode_cursor([orders[-1]['created_at'], orders[-1]['order_id']])
+    for order in orders:
+        order['products'] = []
+    return orders, next_cursor
+
+
+# (sql, params) for the lines of these orders
+def order_lines_query(order_ids):
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    return f"""
+        SELECT oi.order_id, p.product_name, p.size, p.pages, oi.quantity, oi.price
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id IN ({placeholders})
+        ORDER BY oi.order_id, oi.id
+    """, list(order_ids)
+
+
+def attach_lines(orders, lines):
+    by_id = {order['order_id']: order for order in orders}
+    for line in lines:
+        by_id[line.pop('order_id')]['products'].append(line)
+
+
+# One page of the user's orders with this status, newest first, each with its
+# lines under 'products'. `cursor` must be a dictionary cursor. Returns
+# (orders, next_cursor).
+def fetch_orders_page(cursor, user_id, status, after=None, per_page=ORDERS_PER_PAGE):
+    cursor.execute(*orders_page_query(user_id, status, after, per_page))
+    orders, next_cursor = finish_orders_page(cursor.fetchall(), per_page)
+    if orders:
+        cursor.execute(*order_lines_query([order['order_id'] for order in orders]))
+        attach_lines(orders, cursor.fetchall())
+    return orders, next_cursor
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing off the request thread. PBKDF2 is deliberately slow and holds
+# the GIL, so hashing inline lets a burst of logins stall every other request on
+# the worker. Hashes run in a small process pool instead (PASSWORD_HASH_WORKERS
+# processes, with PASSWORD_HASH_QUEUE_SIZE more waiting); when that is full the
+# attempt is refused with Overloaded at once rather than queued behind the burst.
+#
+# Before any hashing, attempts are counted per client IP and per account in
+# sliding windows (LOGIN_ATTEMPTS_PER_IP / LOGIN_ATTEMPTS_PER_ACCOUNT, as
+# (attempts, seconds)); over the limit the attempt is refused with Throttled and
+# costs nothing. Signups count in their own per-IP window (SIGNUP_ATTEMPTS_PER_IP),
+# so a run of signups cannot use up an address's login budget. The counters live
+# in each worker process, so the effective limit is per worker. The IP is
+# request.remote_addr: behind a reverse proxy set PROXY_FIX_X_FOR so it is the
+# client's address rather than the proxy's (see create_app).
+#
+# The process pool is started on first use and again after a fork, so workers
+# forked from a preloaded app get their own.
+
+
+class Rejected(Exception):
+    status = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+# The hashing pool is full
+class Overloaded(Rejected):
+    status = 503
+
+
+# Too many attempts from this IP or for this account
+class Throttled(Rejected):
+    status = 429
+
+
+class SlidingWindow:
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    # Count an attempt for key; returns 0 when allowed, else seconds until the
+    # oldest attempt leaves the window. Refused attempts are not counted.
+    def hit(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.max_keys:
+                    self._prune(now)
+                hits = self._hits[key] = deque()
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0
+
+    def _prune(self, now):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+        while len(self._hits) >= self.max_keys:
+            del self._hits[next(iter(self._hits))]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._hits)
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, queue_size=8, timeout=5,
+                 per_ip=(30, 60), per_account=(10, 300), signup_per_ip=(10, 600)):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.per_ip = SlidingWindow(*per_ip)
+        self.per_account = SlidingWindow(*per_account)
+        self.signup_per_ip = SlidingWindow(*signup_per_ip)
+        self._slots = threading.BoundedSemaphore(max(1, workers) + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._submitted = 0
+        self._finished = 0
+        self._shed = 0
+        self._throttled = 0
+        self._timeouts = 0
+
+    # Start over in a forked child: the parent's in-flight hashes never finish
+    # here, so its slots and counters would leak. Call with _lock held.
+    def _after_fork(self):
+        if self._pid != os.getpid():
+            if self._pid is not None:
+                self._slots = threading.BoundedSemaphore(max(1, self.workers) + self.queue_size)
+                self._executor = None
+                self._submitted = self._finished = 0
+                self._shed = self._throttled = self._timeouts = 0
+            self._pid = os.getpid()
+
+    def _pool(self):
+        with self._lock:
+            self._after_fork()
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _done(self, future=None):
+        with self._lock:
+            self._finished += 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self._after_fork()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._shed += 1
+            raise Overloaded('We are handling a lot of sign-ins right now. Please try again in a moment.', 1)
+        with self._lock:
+            self._submitted += 1
+
+        if not self.workers:  # hash on the request thread, still bounded by the slots
+            try:
+                return fn(*args)
+            finally:
+                self._done()
+
+        try:
+            future = self._pool().submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            with self._lock:
+                self._executor = None  # start a fresh pool next time
+            self._done()
+            raise Overloaded('Sign-in is temporarily unavailable. Please try again in a moment.', 1)
+        # The slot is held until the hash finishes, not just until we stop waiting
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise Overloaded('We are handling a lot of sign-ins right now. Please try again in a moment.', self.timeout)
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            raise Overloaded('Sign-in is temporarily unavailable. Please try again in a moment.', 1)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, 'pbkdf2:sha256')
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def throttle(self, ip=None, account=None):
+        wait = 0
+        if ip is not None:
+            wait = self.per_ip.hit(ip)
+        if not wait and account is not None:
+            wait = self.per_account.hit(str(account).strip().lower())
+        self._refuse(wait)
+
+    def throttle_signup(self, ip):
+        self._refuse(self.signup_per_ip.hit(ip))
+
+    def _refuse(self, wait):
+        if wait:
+            with self._lock:
+                self._throttled += 1
+            raise Throttled('Too many attempts. Please wait a moment and try again.', wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'submitted': self._submitted,
+                'in_flight': self._submitted - self._finished,
+                'shed': self._shed,
+                'throttled': self._throttled,
+                'timeouts': self._timeouts,
+                'tracked_ips': len(self.per_ip),
+                'tracked_accounts': len(self.per_account),
+                'tracked_signup_ips': len(self.signup_per_ip),
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+
+def init_passwords(app):
+    hasher = PasswordHasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_size=app.config.get('PASSWORD_HASH_QUEUE_SIZE', 8),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 5),
+        per_ip=app.config.get('LOGIN_ATTEMPTS_PER_IP', (30, 60)),
+        per_account=app.config.get('LOGIN_ATTEMPTS_PER_ACCOUNT', (10, 300)),
+        signup_per_ip=app.config.get('SIGNUP_ATTEMPTS_PER_IP', (10, 600)),
+    )
+    app.extensions['passwords'] = hasher
+    return hasher
+
+
+def _hasher():
+    return current_app.extensions['passwords']
+
+
+def hash_password(password):
+    return _hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    return _hasher().verify(pwhash, password)
+
+
+# Raises Throttled when this IP or account has used up its attempts
+def throttle(ip=None, account=None):
+    _hasher().throttle(ip=ip, account=account)
+
+
+# Raises Throttled when this IP has used up its signups
+def throttle_signup(ip):
+    _hasher().throttle_signup(ip)
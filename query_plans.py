@@ -0,0 +1,211 @@
+import re
+
+from cache import get_cache
+from database import get_db
+from metrics import normalize
+import inventory
+import seller_stats
+
+# Query plan regression check behind `flask db explain`. The read routes are
+# driven through the test client (and the stock/stats helpers of the write
+# paths inside a transaction that is rolled back), every statement they issue
+# is captured with its real parameters, and each distinct statement is run
+# through EXPLAIN. A plan fails when it reads a table with a full scan or sorts
+# with a filesort over more than min_rows estimated rows, unless the statement
+# is in ALLOWED. Run it against a copy with realistic volumes (such as the
+# bench/route_bench.py database): on a near-empty table MySQL rightly prefers a
+# scan, which is why small estimates are not reported.
+
+DEFAULT_MIN_ROWS = 1000
+
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|INSERT\b.*\bSELECT)\b', re.IGNORECASE | re.DOTALL)
+
+# Plans that are expected, as (statement pattern, allowed problems, reason)
+ALLOWED = [
+    (re.compile(r'FROM categories\b'), {'full scan'}, 'categories is small and cached'),
+    (re.compile(r'SELECT DISTINCT o\.id, o\.created_at FROM products p JOIN order_items'), {'filesort'},
+     "seller_orders sorts the seller's own order lines; no single index spans products and orders"),
+]
+
+# Pages to drive as (role, path); <name> is replaced from sample_ids()
+ROUTES = [
+    ('buyer', '/buyer_dashboard'),
+    ('buyer', '/buyer_dashboard?sort=price_asc'),
+    ('buyer', '/buyer_dashboard?sort=price_desc'),
+    ('buyer', '/buyer_dashboard?sort=name'),
+    ('buyer', '/buyer_dashboard?category_id=<category>'),
+    ('buyer', '/buyer_dashboard?category_id=<category>&sort=price_asc'),
+    ('buyer', '/buyer_dashboard?query=family'),
+    ('buyer', '/buyer_dashboard?query=wedding&category_id=<category>'),
+    ('buyer', '/buyer_dashboard?query=500'),
+    ('buyer', '/cart'),
+    ('buyer', '/checkout'),
+    ('buyer', '/orders_dashboard'),
+    ('buyer', '/orders_dashboard?status=Delivered'),
+    ('seller', '/seller_dashboard'),
+    ('seller', '/seller_orders'),
+    ('seller', '/seller_orders?status=Pending'),
+    ('seller', '/seller_orders?status=Cancelled'),
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/dashboard?role=seller&sort=name'),
+    ('admin', '/admin/dashboard?status=archived&q=a'),
+    ('admin', '/admin/dashboard?status=active&sort=name'),
+    ('admin', '/admin/dashboard?status=active&role=buyer&sort=name'),
+    ('admin', '/admin/dashboard?request_status=all&request_sort=business_name'),
+    ('admin', '/admin/dashboard?request_status=approved&request_sort=business_name'),
+]
+
+
+class RecordingCursor:
+    def __init__(self, cursor, statements):
+        self.wrapped = cursor
+        self.statements = statements
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self.statements.append((operation, params))
+        return self.wrapped.execute(operation, params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.wrapped)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+class RecordingConnection:
+    def __init__(self, connection, statements):
+        self.wrapped = connection
+        self.statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self.wrapped.cursor(*args, **kwargs), self.statements)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+# A buyer with a cart, a seller with products, an admin, a category, a product in
+# stock and an order
+def sample_ids(db):
+    cursor = db.cursor()
+    queries = {
+        'buyer': "SELECT user_id FROM cart_items LIMIT 1",
+        'seller': "SELECT user_id FROM products WHERE user_id IS NOT NULL LIMIT 1",
+        'admin': "SELECT id FROM users WHERE role = 'admin' LIMIT 1",
+        'category': "SELECT id FROM categories LIMIT 1",
+        'product': "SELECT id FROM products WHERE is_archive = 0 AND stock > 0 LIMIT 1",
+        'order': "SELECT order_id FROM order_items LIMIT 1",
+    }
+    ids = {}
+    for name, query in queries.items():
+        cursor.execute(query)
+        row = cursor.fetchone()
+        ids[name] = row[0] if row else None
+    cursor.close()
+    return ids
+
+
+# [(source, sql, params)] issued by the routes and write-path helpers
+def capture(app, ids):
+    captured = []
+    statements = []
+    previous = app.extensions.get('db_connection_wrapper')
+
+    def wrapper(connection):
+        return RecordingConnection(previous(connection) if previous else connection, statements)
+
+    app.extensions['db_connection_wrapper'] = wrapper
+    try:
+        client = app.test_client()
+        for role, path in ROUTES:
+            names = re.findall(r'<(\w+)>', path)
+            if ids.get(role) is None or any(ids.get(name) is None for name in names):
+                continue
+            for name in names:
+                path = path.replace(f'<{name}>', str(ids[name]))
+            with client.session_transaction() as sess:
+                sess['user_id'] = ids[role]
+                sess['role'] = role
+                sess['name'] = 'explain'
+            with app.app_context():
+                get_cache().clear()
+            del statements[:]
+            client.get(path).close()
+            captured.extend((f'GET {path}', sql, params) for sql, params in statements)
+
+        with app.app_context():
+            db = get_db()
+            helpers = []
+            if ids['product'] is not None:
+                helpers.append(('inventory.reserve_lines', lambda: inventory.reserve_lines(
+                    db, [(ids['product'], 1, inventory.lock_products(db, [ids['product']])[ids['product']][3])])))
+            if ids['order'] is not None:
+                helpers.append(('seller_stats.order_placed', lambda: seller_stats.order_placed(db, ids['order'])))
+                helpers.append(('inventory.release_order', lambda: inventory.release_order(db, ids['order'])))
+            if ids['order'] is not None and ids['seller'] is not None:
+                helpers.append(('seller_stats.seller_status_changing', lambda: seller_stats.seller_status_changing(
+                    db, ids['order'], ids['seller'], 'Shipped')))
+            for source, helper in helpers:
+                del statements[:]
+                try:
+                    helper()
+                finally:
+                    db.rollback()
+                captured.extend((source, sql, params) for sql, params in statements)
+    finally:
+        app.extensions['db_connection_wrapper'] = previous
+    return captured
+
+
+def _allowed(shape):
+    allowed = set()
+    for pattern, problems, _ in ALLOWED:
+        if pattern.search(shape):
+            allowed |= problems
+    return allowed
+
+
+# EXPLAIN one statement: (plan rows, [problems])
+def explain(db, sql, params, min_rows=DEFAULT_MIN_ROWS):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute('EXPLAIN ' + sql, params)
+    plan = cursor.fetchall()
+    cursor.close()
+    db.rollback()
+
+    problems = []
+    for row in plan:
+        rows = int(row.get('rows') or 0)
+        extra = row.get('Extra') or ''
+        if rows < min_rows:
+            continue
+        if row.get('type') == 'ALL':
+            problems.append(('full scan', f"full scan of {row.get('table')} (~{rows} rows)"))
+        if 'Using filesort' in extra:
+            problems.append(('filesort', f"filesort on {row.get('table')} (~{rows} rows)"))
+    return plan, problems
+
+
+# Capture and EXPLAIN every distinct statement. Returns a list of dicts with
+# source, statement shape, plan, problems and failed.
+def check(app, min_rows=DEFAULT_MIN_ROWS):
+    with app.app_context():
+        ids = sample_ids(get_db())
+    seen = set()
+    results = []
+    for source, sql, params in capture(app, ids):
+        shape = normalize(sql)
+        if shape in seen or not EXPLAINABLE.match(sql):
+            continue
+        seen.add(shape)
+        with app.app_context():
+            plan, problems = explain(get_db(), sql, params, min_rows)
+        allowed = _allowed(shape)
+        results.append({
+            'source': source,
+            'statement': shape,
+            'plan': plan,
+            'problems': [text for kind, text in problems],
+            'failed': any(kind not in allowed for kind, _ in problems),
+        })
+    return results
@@ -0,0 +1,50 @@
+import re
+
+# Product search backed by the FULLTEXT index on products(product_name, size)
+# (migrations/002). InnoDB keeps the index in sync with every INSERT/UPDATE, so
+# add_product, edit_product and the archive routes need no extra bookkeeping.
+
+# InnoDB's default stopword list; a required (+) stopword would match nothing
+STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+}
+
+# innodb_ft_min_token_size; shorter words are never indexed
+MIN_TOKEN_SIZE = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+PRICE_RE = re.compile(r'^\s*\d+(\.\d{1,2})?\s*$')
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) >= MIN_TOKEN_SIZE and token not in STOPWORDS and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+# Every word is required and matched as a prefix, so "fam memo" finds "Family Memories"
+def boolean_query(text):
+    return ' '.join(f'+{token}*' for token in tokenize(text))
+
+
+# SQL condition, params and relevance expression for a search box query.
+# Returns (None, [], None) when the query has nothing searchable.
+def product_search(text):
+    if PRICE_RE.match(text):
+        return "price = %s", [text.strip()], None
+
+    query = boolean_query(text)
+    if query:
+        match = "MATCH(product_name, size) AGAINST (%s IN BOOLEAN MODE)"
+        return match, [query], match
+
+    # Only short words (e.g. "us"): fall back to an index-friendly name prefix match
+    prefix = text.strip()
+    if prefix:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return "product_name LIKE %s", [escaped + '%'], None
+    return None, [], None
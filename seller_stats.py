@@ -0,0 +1,216 @@
+from decimal import Decimal
+
+# Incrementally maintained seller dashboard numbers (table seller_stats, see
+# migrations/004). Every helper here runs on the caller's connection without
+# committing, so the counters change in the same transaction as the order or
+# product write that caused them. A seller's lines within one order always share
+# a status, so each (seller, order) pair counts once per status:
+#   pending_orders  orders with this seller's lines Pending
+#   active_orders   orders with this seller's lines Shipped
+#   total_sales     sum of quantity * price of this seller's Delivered lines
+#   total_stock     sum of stock over this seller's non-archived products
+# Cancelled orders are excluded from all three order counters.
+
+ORDER_COUNTERS = {'Pending': 'pending_orders', 'Shipped': 'active_orders'}
+
+STATS_COLUMNS = ('active_orders', 'pending_orders', 'total_stock', 'total_sales')
+
+# Recomputes the counters from the base tables; used by rebuild and verify
+RECOMPUTE_QUERY = """
+    SELECT
+        u.id AS seller_id,
+        (SELECT COUNT(DISTINCT oi.order_id)
+           FROM order_items oi
+           JOIN products p ON oi.product_id = p.id
+           JOIN orders o ON oi.order_id = o.id
+          WHERE p.user_id = u.id AND oi.seller_status = 'Shipped' AND o.status != 'Cancelled') AS active_orders,
+        (SELECT COUNT(DISTINCT oi.order_id)
+           FROM order_items oi
+           JOIN products p ON oi.product_id = p.id
+           JOIN orders o ON oi.order_id = o.id
+          WHERE p.user_id = u.id AND oi.seller_status = 'Pending' AND o.status != 'Cancelled') AS pending_orders,
+        (SELECT COALESCE(SUM(stock), 0)
+           FROM products
+          WHERE user_id = u.id AND is_archive = 0) AS total_stock,
+        (SELECT COALESCE(SUM(oi.quantity * oi.price), 0)
+           FROM order_items oi
+           JOIN products p ON oi.product_id = p.id
+           JOIN orders o ON oi.order_id = o.id
+          WHERE p.user_id = u.id AND oi.seller_status = 'Delivered' AND o.status != 'Cancelled') AS total_sales
+    FROM users u
+    WHERE (u.role = 'seller' OR EXISTS (SELECT 1 FROM products WHERE user_id = u.id))
+"""
+
+
+def bump(db, seller_id, active_orders=0, pending_orders=0, total_stock=0, total_sales=0):
+    if not (active_orders or pending_orders or total_stock or total_sales):
+        return
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO seller_stats (seller_id, active_orders, pending_orders, total_stock, total_sales)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            active_orders = active_orders + VALUES(active_orders),
+            pending_orders = pending_orders + VALUES(pending_orders),
+            total_stock = total_stock + VALUES(total_stock),
+            total_sales = total_sales + VALUES(total_sales)
+    """, (seller_id, active_orders, pending_orders, total_stock, total_sales))
+    cursor.close()
+
+
+# Lock and group the order's lines by seller and status: {seller_id: {status: amount}}.
+# Only the order_items rows are locked; product rows are locked in id order by
+# inventory.lock_products alone, so this cannot deadlock with a checkout.
+def _order_lines(db, order_id, seller_id=None):
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT product_id, seller_status, quantity, price
+        FROM order_items
+        WHERE order_id = %s
+        FOR UPDATE
+    """, (order_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.close()
+        return {}
+
+    # A product's seller never changes, so a plain read is enough here
+    product_ids = sorted({row[0] for row in rows})
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(f"SELECT id, user_id FROM products WHERE id IN ({placeholders})", product_ids)
+    sellers = dict(cursor.fetchall())
+    cursor.close()
+
+    lines = {}
+    for product_id, status, quantity, price in rows:
+        line_seller = sellers.get(product_id)
+        if line_seller is None or (seller_id is not None and line_seller != seller_id):
+            continue
+        statuses = lines.setdefault(line_seller, {})
+        statuses[status] = statuses.get(status, Decimal(0)) + quantity * price
+    return lines
+
+
+def _deltas(statuses, sign, deltas=None):
+    deltas = {} if deltas is None else deltas
+    for status, amount in statuses.items():
+        if status in ORDER_COUNTERS:
+            deltas[ORDER_COUNTERS[status]] = deltas.get(ORDER_COUNTERS[status], 0) + sign
+        elif status == 'Delivered':
+            deltas['total_sales'] = deltas.get('total_sales', 0) + sign * amount
+    return deltas
+
+
+def _order_status(db, order_id):
+    cursor = db.cursor()
+    cursor.execute("SELECT status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+
+# Add (sign=1) or remove (sign=-1) an order's quantities from its sellers' total_stock
+def _order_stock(db, order_id, sign):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO seller_stats (seller_id, total_stock)
+        SELECT p.user_id, %s * SUM(oi.quantity)
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id = %s AND p.is_archive = 0
+        GROUP BY p.user_id
+        ON DUPLICATE KEY UPDATE total_stock = total_stock + VALUES(total_stock)
+    """, (sign, order_id))
+    cursor.close()
+
+
+# New order: every seller in it gains one pending order and loses the sold stock
+def order_placed(db, order_id):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO seller_stats (seller_id, pending_orders)
+        SELECT p.user_id, 1
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id = %s
+        GROUP BY p.user_id
+        ON DUPLICATE KEY UPDATE pending_orders = pending_orders + 1
+    """, (order_id,))
+    cursor.close()
+    _order_stock(db, order_id, -1)
+
+
+# Call before the seller's lines are updated to new_status
+def seller_status_changing(db, order_id, seller_id, new_status):
+    if _order_status(db, order_id) in (None, 'Cancelled'):
+        return
+    statuses = _order_lines(db, order_id, seller_id).get(seller_id)
+    if not statuses:
+        return
+    deltas = _deltas(statuses, -1)
+    bump(db, seller_id, **_deltas({new_status: sum(statuses.values())}, 1, deltas))
+
+
+# Call before the order is marked Cancelled; its stock goes back to the sellers
+def order_cancelling(db, order_id):
+    if _order_status(db, order_id) in (None, 'Cancelled'):
+        return
+    for seller_id, statuses in _order_lines(db, order_id).items():
+        bump(db, seller_id, **_deltas(statuses, -1))
+    _order_stock(db, order_id, 1)
+
+
+def stock_changed(db, seller_id, delta):
+    bump(db, seller_id, total_stock=delta)
+
+
+def rebuild(db, seller_id=None):
+    query = RECOMPUTE_QUERY
+    params = ()
+    if seller_id is not None:
+        query += " AND u.id = %s"
+        params = (seller_id,)
+    cursor = db.cursor()
+    cursor.execute(f"""
+        INSERT INTO seller_stats (seller_id, active_orders, pending_orders, total_stock, total_sales)
+        {query}
+        ON DUPLICATE KEY UPDATE
+            active_orders = VALUES(active_orders),
+            pending_orders = VALUES(pending_orders),
+            total_stock = VALUES(total_stock),
+            total_sales = VALUES(total_sales)
+    """, params)
+    count = cursor.rowcount
+    cursor.close()
+    return count
+
+
+# Rows where the stored counters differ from a fresh recomputation
+def verify(db):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM seller_stats")
+    stored = {row['seller_id']: row for row in cursor.fetchall()}
+    cursor.execute(RECOMPUTE_QUERY)
+    mismatches = []
+    for expected in cursor.fetchall():
+        actual = stored.get(expected['seller_id'])
+        for column in STATS_COLUMNS:
+            actual_value = actual[column] if actual else None
+            if actual_value is None or Decimal(actual_value) != Decimal(expected[column]):
+                mismatches.append((expected['seller_id'], column, actual_value, expected[column]))
+    cursor.close()
+    return mismatches
+
+
+# Stats row for the dashboard: a single primary-key read, built on first use
+def get(db, seller_id):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM seller_stats WHERE seller_id = %s", (seller_id,))
+    row = cursor.fetchone()
+    if row is None:
+        rebuild(db, seller_id)
+        db.commit()
+        cursor.execute("SELECT * FROM seller_stats WHERE seller_id = %s", (seller_id,))
+        row = cursor.fetchone()
+    cursor.close()
+    return row or dict.fromkeys(STATS_COLUMNS, 0)